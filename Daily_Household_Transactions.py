@@ -1,198 +1,2359 @@
+import time
+IMPORT_STARTED = time.perf_counter()
+
+import argparse
+import glob
+import hashlib
+import inspect
+import json
+import os
+import re
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager, nullcontext
+
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
+
+# matplotlib and seaborn are slow to import, so they are only loaded by
+# load_plotting() once the first chart is actually drawn
+plt = None
+sns = None
+
+# resource is Unix-only: without it peak RSS is not reported
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# pyarrow is optional: without it the cleaned-data cache is simply disabled
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:
+    pa = None
 
 # Suppress warnings for cleaner output in a project context
 import warnings
 warnings.filterwarnings('ignore')
 
-print("--- Project: Daily Household Transactions ---")
+DATA_FILE = 'Daily Household Transactions.csv'
+CACHE_DIR = '.transactions_cache'
+# Bump whenever clean_data changes so stale caches are not reused
+CACHE_VERSION = 14
+# Resolution of charts written in batch mode
+CHART_DPI = 100
+# Amount histogram: finest bin width and most bins kept before bins are merged pairwise
+HISTOGRAM_BASE_WIDTH = 2.0 ** -7
+HISTOGRAM_MAX_BINS = 2 ** 14
+# Accuracy parameter of the Amount quantile sketches (rank error is roughly 1.7 / k)
+SKETCH_K = 200
+# Columns whose groups get an Amount quantile sketch for the Step 3 boxplots
+# and the anomaly statistics
+SKETCH_GROUPS = ['Category', 'Subcategory', 'Income/Expense']
+# Clustered heatmap: cells with |correlation| at or above this are annotated
+HEATMAP_ANNOTATE_THRESHOLD = 0.5
+# Number of hash-index segments kept before the incremental index is compacted
+INDEX_SEGMENT_LIMIT = 32
+# Suffix of incremental-state files written by a run that has not finished yet
+PENDING_SUFFIX = '.pending'
+
+# Declared column schema for the loader.
+# The low-cardinality text columns (~10 modes, ~50 categories) are stored as
+# categoricals, so value_counts/groupby/isin in Steps 3-5 work on integer codes.
+# 'Date' is parsed in Step 2 and free-text 'Note' stays a plain string column.
+TRANSACTION_DTYPES = {
+    'Mode': 'category',
+    'Category': 'category',
+    'Subcategory': 'category',
+    'Income/Expense': 'category',
+    'Currency': 'category',
+    'Amount': 'float64',
+}
+CATEGORY_DTYPES = {col: dtype for col, dtype in TRANSACTION_DTYPES.items() if dtype == 'category'}
+
+# Stage records collected when --profile is given (None disables the instrumentation)
+PROFILE = None
+
+
+# --- Instrumentation ---
+# Each step and each chart runs inside profile_stage(), which records wall time,
+# CPU time, the process's peak RSS so far and, when the step sets
+# stage['frame'], the deep memory usage of the DataFrame it produced.
+# Charts rendered in batch mode are measured in their worker process and the
+# records are sent back with the chart's path.
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+    return round(peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+@contextmanager
+def profile_stage(name, records=None):
+    records = PROFILE if records is None else records
+    stage = {}
+    if records is None:
+        yield stage
+        return
+
+    wall_started = time.perf_counter()
+    cpu_started = time.process_time()
+    yield stage
+    frame = stage.pop('frame', None)
+    records.append({
+        'stage': name,
+        'wall_s': round(time.perf_counter() - wall_started, 4),
+        'cpu_s': round(time.process_time() - cpu_started, 4),
+        'peak_rss_mb': peak_rss_mb(),
+        'dataframe_mb': None if frame is None else round(frame.memory_usage(deep=True).sum() / 1024 ** 2, 3),
+        'rows': None if frame is None else len(frame),
+    })
+
+
+def write_profile(records, path):
+    print("\nRun profile:")
+    print(pd.DataFrame(records).to_string(index=False))
+    if path.endswith('.json'):
+        with open(path, 'w') as f:
+            json.dump(records, f, indent=2)
+    else:
+        pd.DataFrame(records).to_csv(path, index=False)
+    print(f"Profile written to '{path}'.")
+
 
 # --- Step 1: Import Libraries and Load Data ---
-print("\nStep 1: Importing Libraries and Loading Data...")
-try:
-    df = pd.read_csv('Daily Household Transactions.csv')
-    print("Dataset 'Daily Household Transactions.csv' loaded successfully.")
-except FileNotFoundError:
-    print("Error: 'Daily Household Transactions.csv' not found. Please ensure the file is in the correct directory.")
-    exit() # Exit if the file is not found, as further steps depend on it
-
-print("\nFirst 5 rows of the dataset:")
-print(df.head())
-print("\nDataset Info:")
-df.info()
-print("\nInitial Missing Values:")
-print(df.isnull().sum())
+def read_transactions(path, **kwargs):
+    try:
+        return pd.read_csv(path, dtype=TRANSACTION_DTYPES, **kwargs)
+    except ValueError:
+        # A non-numeric 'Amount' slipped in; read it as text and let Step 2 coerce it
+        return pd.read_csv(path, dtype=CATEGORY_DTYPES, **kwargs)
+
+
+def report_memory_savings(df):
+    # What the categorical columns would cost as Python-object strings:
+    # one pointer per row plus the size of the string object it points to.
+    object_bytes = 0
+    category_bytes = 0
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            codes = df[col].cat.codes.to_numpy()
+            sizes = np.array([sys.getsizeof(c) for c in df[col].cat.categories], dtype=np.int64)
+            counts = np.bincount(codes[codes >= 0], minlength=len(sizes))
+            object_bytes += int(counts @ sizes) + 8 * len(df)
+            category_bytes += int(df[col].memory_usage(deep=True, index=False))
+    if object_bytes:
+        print(f"Categorical columns use {category_bytes / 1024:.1f} KB instead of "
+              f"{object_bytes / 1024:.1f} KB as object strings "
+              f"(saved {(object_bytes - category_bytes) / 1024:.1f} KB).")
+
+
+def load_data(path=DATA_FILE):
+    print("\nStep 1: Importing Libraries and Loading Data...")
+    try:
+        df = read_transactions(path)
+        print(f"Dataset '{path}' loaded successfully.")
+    except FileNotFoundError:
+        print(f"Error: '{path}' not found. Please ensure the file is in the correct directory.")
+        exit() # Exit if the file is not found, as further steps depend on it
+
+    print("\nFirst 5 rows of the dataset:")
+    print(df.head())
+    print("\nDataset Info:")
+    df.info(memory_usage='deep')
+    report_memory_savings(df)
+    return df
+
 
 # --- Step 2: Data Cleaning ---
-print("\nStep 2: Data Cleaning...")
-
-# Convert 'Date' column to datetime objects
-# The date format in the file is 'DD/MM/YYYY HH:MM:SS' or 'DD/MM/YYYY'
-# Using infer_datetime_format=True can help pandas automatically detect the format
-df['Date'] = pd.to_datetime(df['Date'], infer_datetime_format=True, errors='coerce')
-print(f"Date column converted to datetime. New Dtype: {df['Date'].dtype}")
-
-# Handle missing values
-# As per the PDF example's data structure, 'Subcategory' and 'Note' have missing values.
-# The PDF suggests filling 'Category' with 'Unknown', but our dataset has missing in 'Subcategory' and 'Note'.
-df['Subcategory'].fillna('Unknown', inplace=True)
-df['Note'].fillna('No Note', inplace=True)
-print("\nMissing values after filling 'Subcategory' and 'Note':")
-print(df.isnull().sum())
-
-# Ensure 'Amount' is numeric (it's already float64, but good to ensure no non-numeric values snuck in)
-df['Amount'] = pd.to_numeric(df['Amount'], errors='coerce')
-# If any NaN were introduced by coerce, fill them with the mean or median
-if df['Amount'].isnull().any():
-    mean_amount = df['Amount'].mean()
-    df['Amount'].fillna(mean_amount, inplace=True)
-    print(f"Filled missing/non-numeric 'Amount' values with mean: {mean_amount:.2f}")
-
-# Remove duplicates
-initial_rows = df.shape[0]
-df.drop_duplicates(inplace=True)
-rows_after_dedup = df.shape[0]
-print(f"Removed {initial_rows - rows_after_dedup} duplicate rows.")
-
-print("\nData types after cleaning:")
-print(df.dtypes)
-print("\nFirst 5 rows after cleaning:")
-print(df.head())
+# The date format in the file is 'DD/MM/YYYY HH:MM:SS' or a bare 'D/M/YYYY'.
+# Letting pandas infer the format per element is slow and can read ambiguous
+# dates such as 3/6/2017 month-first, so both layouts are parsed explicitly
+# day-first. Ledgers repeat the same date strings many times, so each distinct
+# string is parsed only once and the result is broadcast back to the rows.
+DATE_FORMATS = {
+    'DD/MM/YYYY HH:MM:SS': '%d/%m/%Y %H:%M:%S',
+    'D/M/YYYY': '%d/%m/%Y',
+}
+
+
+def parse_transaction_dates(dates):
+    codes, uniques = pd.factorize(dates)
+    uniques = pd.Series(uniques, dtype=object)
+    parsed = pd.Series(pd.NaT, index=uniques.index, dtype='datetime64[ns]')
+    layout = np.full(len(uniques), -1)
+    for i, fmt in enumerate(DATE_FORMATS.values()):
+        todo = parsed.isna().to_numpy()
+        if not todo.any():
+            break
+        attempt = pd.to_datetime(uniques[todo], format=fmt, errors='coerce')
+        parsed[todo] = attempt
+        layout[np.flatnonzero(todo)[attempt.notna().to_numpy()]] = i
+
+    # Rows per layout; code -1 marks missing dates and layout -1 unparseable ones.
+    # A trailing NaT / -1 entry makes code -1 pick the missing value directly, so
+    # a column without a single date (no uniques at all) needs no special case
+    row_layout = np.append(layout, -1)[codes]
+    counts = np.bincount(row_layout + 1, minlength=len(DATE_FORMATS) + 1)
+    format_counts = dict(zip(DATE_FORMATS, counts[1:].tolist()))
+    format_counts['unparsed'] = int(counts[0])
+
+    values = np.append(parsed.to_numpy(), np.datetime64('NaT', 'ns'))
+    result = pd.Series(values[codes], index=dates.index, name=dates.name)
+    return result, format_counts
+
+
+# --- Data-quality profile ---
+# Everything Step 2 reports about the raw table comes from one profile instead
+# of repeated isnull() scans of the whole frame: per-column null counts (one
+# non-null count per column), 'Amount' values that failed numeric coercion,
+# dates that failed both layouts, negative and zero amounts and, once the rows
+# are cleaned, the duplicate count. The parse and coercion results are the ones
+# Step 2 keeps anyway, so the profile itself costs no extra parsing; the
+# missing values left after filling are derived from it rather than recounted.
+FILLED_COLUMNS = ['Subcategory', 'Note', 'Amount']
+
+
+def profile_data_quality(df, amounts, date_format_counts):
+    nulls = len(df) - df.count()
+    values = amounts.to_numpy()
+    amount_missing = int(np.isnan(values).sum())
+    remaining = nulls.copy()
+    remaining[[col for col in FILLED_COLUMNS if col in remaining.index]] = 0
+    remaining['Date'] = date_format_counts['unparsed']
+    return {
+        'rows': len(df),
+        'nulls': nulls,
+        'nulls_after_filling': remaining,
+        'amount_missing': amount_missing,
+        'amount_coercion_failures': amount_missing - int(nulls['Amount']),
+        'date_format_counts': date_format_counts,
+        'date_parse_failures': date_format_counts['unparsed'] - int(nulls['Date']),
+        'negative_amounts': int((values < 0).sum()),
+        'zero_amounts': int((values == 0).sum()),
+        'amount_fill': None,
+        'duplicates': None,
+    }
+
+
+def report_data_quality(quality):
+    print("Missing values in the raw data:")
+    print(quality['nulls'])
+    print(f"\nRows parsed per date format: {quality['date_format_counts']}")
+    print(f"Dates that could not be parsed: {quality['date_parse_failures']}")
+    print(f"Non-numeric 'Amount' values: {quality['amount_coercion_failures']}")
+    print(f"Negative amounts: {quality['negative_amounts']}, zero amounts: {quality['zero_amounts']}")
+    print("\nMissing values after filling 'Subcategory' and 'Note':")
+    print(quality['nulls_after_filling'])
+    if quality['amount_fill'] is not None:
+        print(f"Filled missing/non-numeric 'Amount' values with mean: {quality['amount_fill']:.2f}")
+    elif quality['amount_missing']:
+        print(f"Filled {quality['amount_missing']} missing/non-numeric 'Amount' values with their chunk's mean")
+    print(f"Removed {quality['duplicates']} duplicate rows.")
+
+
+# Streaming and incremental runs clean chunk by chunk; the chunks' profiles add
+# up to the profile of the whole file. Each chunk fills its missing amounts with
+# its own mean, so a merged profile only keeps how many values were filled.
+QUALITY_COUNTS = ['rows', 'nulls', 'nulls_after_filling', 'amount_missing', 'amount_coercion_failures',
+                  'date_parse_failures', 'negative_amounts', 'zero_amounts', 'duplicates']
+
+
+def merge_data_quality(total, part):
+    if total is None:
+        return part
+    merged = {key: total[key] + part[key] for key in QUALITY_COUNTS}
+    merged['date_format_counts'] = {
+        fmt: count + part['date_format_counts'][fmt] for fmt, count in total['date_format_counts'].items()
+    }
+    merged['amount_fill'] = None
+    return merged
+
+
+# Every cleaned column is computed once from the raw column and the cleaned
+# frame is assembled from them in a single step, instead of filling column
+# views in place (which under copy-on-write only fills a hidden copy).
+# Untouched columns are shared with the raw frame rather than copied, and the
+# rows are only copied once more when there are duplicates to drop.
+def fill_subcategory(subcategory):
+    if isinstance(subcategory.dtype, pd.CategoricalDtype) and 'Unknown' not in subcategory.cat.categories:
+        subcategory = subcategory.cat.add_categories('Unknown')
+    return subcategory.fillna('Unknown')
+
+
+def clean_data(df, verbose=True, quality=None):
+    # Convert 'Date' column to datetime objects and ensure 'Amount' is numeric
+    # (it's already float64, but good to ensure no non-numeric values snuck in)
+    dates, date_format_counts = parse_transaction_dates(df['Date'])
+    amounts = pd.to_numeric(df['Amount'], errors='coerce').astype(TRANSACTION_DTYPES['Amount'])
+    profile = profile_data_quality(df, amounts, date_format_counts)
+    if verbose:
+        print(f"Date column converted to datetime. New Dtype: {dates.dtype}")
+
+    # If any NaN were introduced by coerce, fill them with the mean or median
+    if profile['amount_missing']:
+        profile['amount_fill'] = amounts.mean()
+        amounts = amounts.fillna(profile['amount_fill'])
+
+    # Handle missing values
+    # As per the PDF example's data structure, 'Subcategory' and 'Note' have missing values.
+    # The PDF suggests filling 'Category' with 'Unknown', but our dataset has missing in 'Subcategory' and 'Note'.
+    cleaned_columns = {
+        'Date': dates,
+        'Subcategory': fill_subcategory(df['Subcategory']),
+        'Note': df['Note'].fillna('No Note'),
+        'Amount': amounts,
+    }
+    cleaned = pd.DataFrame({col: cleaned_columns.get(col, df[col]) for col in df.columns}, copy=False)
+
+    # Remove duplicates
+    duplicated = cleaned.duplicated().to_numpy()
+    profile['duplicates'] = int(duplicated.sum())
+    if profile['duplicates']:
+        cleaned = cleaned[~duplicated]
+    if verbose:
+        report_data_quality(profile)
+        print(f"Cleaned table: {cleaned.memory_usage(deep=True).sum() / 1024 ** 2:.2f} MB, "
+              f"peak process memory so far: {peak_rss_mb()} MB.")
+    if quality is not None:
+        quality.update(profile)
+    return cleaned
+
+
+# --- Columnar cache of the cleaned transactions ---
+# The cleaned Step 2 table is written as an uncompressed Arrow IPC file so that
+# later runs can memory-map it instead of re-parsing and re-cleaning the CSV.
+# Cache files are keyed by the source file's size, mtime and content hash.
+# Hashing a very large export takes a while, so the hash is remembered in a
+# manifest and only recomputed when the file's size or mtime changes.
+# Whenever a new entry is written, the entries no source maps to any more (an
+# edited or replaced file, an older CACHE_VERSION) are deleted with it. Only
+# files named like cache entries are deleted: --cache-dir may be a directory
+# that holds other files, the ledger itself among them.
+CACHE_ENTRY_PATTERN = re.compile(r'^\d+-\d+-[0-9a-f]+-v\d+-\w+(\.arrow|-aggregates\.pkl)$')
+
+
+def source_fingerprint(path, cache_dir=CACHE_DIR):
+    stat = os.stat(path)
+    manifest_file = os.path.join(cache_dir, 'manifest.json')
+    try:
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        manifest = {}
+
+    key = os.path.abspath(path)
+    entry = manifest.get(key)
+    if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+        return f"{stat.st_size}-{stat.st_mtime_ns}-{entry['hash']}"
+
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    manifest[key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'hash': digest.hexdigest()}
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(manifest_file, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return f"{stat.st_size}-{stat.st_mtime_ns}-{digest.hexdigest()}"
+
+
+def cache_key(path, cache_dir=CACHE_DIR, variant='full'):
+    if cache_dir is None:
+        return None
+    try:
+        fingerprint = source_fingerprint(path, cache_dir)
+    except FileNotFoundError:
+        return None
+    return os.path.join(cache_dir, f"{fingerprint}-v{CACHE_VERSION}-{variant}")
+
+
+def cache_file_for(path, cache_dir=CACHE_DIR, variant='full'):
+    if pa is None:
+        return None
+    key = cache_key(path, cache_dir, variant)
+    return key and key + '.arrow'
+
+
+def aggregates_file_for(path, cache_dir=CACHE_DIR, variant='full'):
+    key = cache_key(path, cache_dir, variant)
+    return key and key + '-aggregates.pkl'
+
+
+def prune_cache(cache_file):
+    cache_dir = os.path.dirname(cache_file)
+    try:
+        with open(os.path.join(cache_dir, 'manifest.json')) as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return
+    current = tuple(
+        f"{entry['size']}-{entry['mtime_ns']}-{entry['hash']}-v{CACHE_VERSION}-" for entry in manifest.values()
+    )
+    for name in os.listdir(cache_dir):
+        # '.tmp' files (another run may still be writing its entry) do not match either
+        if CACHE_ENTRY_PATTERN.match(name) and not name.startswith(current):
+            os.remove(os.path.join(cache_dir, name))
+
+
+def save_pickle(obj, path):
+    pd.to_pickle(obj, path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+
+def read_cached_frame(cache_file):
+    # Memory-mapped read: the file's pages are loaded lazily by the OS
+    return pa.ipc.open_file(pa.memory_map(cache_file)).read_pandas()
+
+
+def iter_cached_chunks(cache_file):
+    reader = pa.ipc.open_file(pa.memory_map(cache_file))
+    for i in range(reader.num_record_batches):
+        # Streamed batches store plain strings (see stream_transactions)
+        yield reader.get_batch(i).to_pandas().astype(CATEGORY_DTYPES)
+
+
+def write_cached_frame(df, cache_file):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    tmp_file = cache_file + '.tmp'
+    with pa.OSFile(tmp_file, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_file, cache_file)
+
+
+# --- Aggregation cube (Steps 4 and 5) ---
+# Every time series and the correlation matrix are roll-ups of one materialized
+# cube: sum, count, mean, min and max of 'Amount' by
+# day x Category x Subcategory x Mode x Income/Expense.
+# The cube is built in a single grouped pass over the rows, and because sum,
+# count, min and max are all mergeable, cubes of chunks or daily batches can be
+# combined without going back to the raw rows.
+CUBE_DIMENSIONS = ['Category', 'Subcategory', 'Mode', 'Income/Expense']
+CUBE_MERGE = {'sum': 'sum', 'count': 'sum', 'min': 'min', 'max': 'max'}
+
+
+def day_keys(dates):
+    # Floor timestamps to whole days with a datetime64[D] cast (an integer division
+    # on the underlying int64 values) instead of building a Python date per row
+    return pd.DatetimeIndex(dates.to_numpy().astype('datetime64[D]'), name='Day')
+
+
+def build_cube(df):
+    dated = df.dropna(subset=['Date'])
+    day = day_keys(dated['Date'])
+    cube = (dated.groupby([day] + CUBE_DIMENSIONS, observed=True, dropna=False)['Amount']
+            .agg(['sum', 'count', 'min', 'max']))
+    cube['mean'] = cube['sum'] / cube['count']
+    return cube
+
+
+def merge_cubes(total, part):
+    if total is None:
+        return part
+    combined = pd.concat([total, part])
+    cube = combined.groupby(level=combined.index.names, observed=True, dropna=False).agg(CUBE_MERGE)
+    cube['mean'] = cube['sum'] / cube['count']
+    return cube
+
+
+def cube_months(cube):
+    return cube.index.get_level_values('Day').to_period('M').rename('YearMonth')
+
+
+def cube_monthly_totals(cube):
+    return cube['sum'].groupby(cube_months(cube)).sum()
+
+
+def cube_daily_totals(cube):
+    return cube['sum'].groupby(level='Day').sum()
+
+
+def cube_month_category(cube):
+    keys = [cube_months(cube), cube.index.get_level_values('Category')]
+    return cube[['sum', 'count']].groupby(keys, observed=True).sum()
+
+
+# --- Amount histogram (Step 3) ---
+# Instead of handing every raw amount to seaborn, amounts are counted into a
+# fixed grid of bins in one vectorized pass. Bin widths are powers of two times
+# HISTOGRAM_BASE_WIDTH; whenever the value range would need more than
+# HISTOGRAM_MAX_BINS bins, neighbouring bins are merged pairwise and the width
+# doubles. Two histograms can therefore always be brought to a common width
+# and added, so chunks and batches merge exactly and memory stays bounded.
+# A histogram is a dict: bin 'width', integer bin id of the first bin
+# ('offset') and the 'counts' array.
+def coarsen_histogram(hist, width):
+    factor = int(round(width / hist['width']))
+    if factor == 1 or not len(hist['counts']):
+        return {**hist, 'width': width}
+    ids = hist['offset'] + np.arange(len(hist['counts']))
+    new_ids = ids // factor
+    counts = np.bincount(new_ids - new_ids[0], weights=hist['counts']).astype(np.int64)
+    return {'width': width, 'offset': int(new_ids[0]), 'counts': counts}
+
+
+def fit_histogram(hist):
+    width = hist['width']
+    while len(hist['counts']) > HISTOGRAM_MAX_BINS:
+        width *= 2
+        hist = coarsen_histogram(hist, width)
+    return hist
+
+
+def amount_histogram(amounts):
+    values = amounts.to_numpy(dtype=np.float64)
+    values = values[np.isfinite(values)]
+    width = HISTOGRAM_BASE_WIDTH
+    if len(values):
+        span = (values.max() - values.min()) / width
+        if span >= HISTOGRAM_MAX_BINS:
+            width *= 2.0 ** np.ceil(np.log2((span + 1) / HISTOGRAM_MAX_BINS))
+    bins = np.floor(values / width).astype(np.int64)
+    offset = int(bins.min()) if len(bins) else 0
+    counts = np.bincount(bins - offset).astype(np.int64)
+    return fit_histogram({'width': width, 'offset': offset, 'counts': counts})
+
+
+def merge_histograms(total, part):
+    # An empty histogram (an all-duplicate chunk, a header-only ledger) has no bins to line up
+    if not len(part['counts']):
+        return total
+    if not len(total['counts']):
+        return part
+    width = max(total['width'], part['width'])
+    total = coarsen_histogram(total, width)
+    part = coarsen_histogram(part, width)
+    offset = min(total['offset'], part['offset'])
+    end = max(total['offset'] + len(total['counts']), part['offset'] + len(part['counts']))
+    counts = np.zeros(end - offset, dtype=np.int64)
+    for hist in (total, part):
+        start = hist['offset'] - offset
+        counts[start:start + len(hist['counts'])] += hist['counts']
+    return fit_histogram({'width': width, 'offset': offset, 'counts': counts})
+
+
+def binned_kde(hist):
+    # Gaussian KDE of the binned amounts: the bin counts are convolved with a
+    # Gaussian kernel sampled on the same grid, using an FFT. The bandwidth
+    # follows Scott's rule like seaborn's default kde=True.
+    counts = hist['counts'].astype(np.float64)
+    width = hist['width']
+    centers = (hist['offset'] + np.arange(len(counts)) + 0.5) * width
+    n = counts.sum()
+    if n < 2:
+        return centers, np.zeros_like(counts)
+    mean = (centers * counts).sum() / n
+    std = np.sqrt((counts * (centers - mean) ** 2).sum() / (n - 1))
+    bandwidth = std * n ** (-1 / 5)
+    if bandwidth <= 0:
+        return centers, counts / (n * width)
+
+    half = int(np.ceil(4 * bandwidth / width))
+    kernel = np.exp(-0.5 * (np.arange(-half, half + 1) * width / bandwidth) ** 2)
+    kernel /= kernel.sum()
+    nfft = 1 << int(np.ceil(np.log2(len(counts) + len(kernel) - 1)))
+    smoothed = np.fft.irfft(np.fft.rfft(counts, nfft) * np.fft.rfft(kernel, nfft), nfft)
+    smoothed = np.clip(smoothed[half:half + len(counts)], 0, None)
+    return centers, smoothed / (n * width)
+
+
+# --- Amount quantile sketches (Step 3 boxplots) ---
+# The boxplots only need quartiles, whiskers and outliers per group, so each
+# group keeps a KLL quantile sketch instead of its full array of amounts.
+# A sketch is a stack of compactors: level h holds items that each stand for
+# 2**h amounts. When a level outgrows its capacity it is sorted and every
+# other item is promoted to the next level. Capacities shrink by 2/3 per level
+# below the top one, so a sketch holds about 3 * SKETCH_K items however many
+# amounts it has seen. Sketches of chunks or batches merge level by level.
+# Exact count, min and max are tracked alongside.
+def sketch_capacity(level, levels):
+    return max(2, int(np.ceil(SKETCH_K * (2 / 3) ** (levels - 1 - level))))
+
+
+def compress_sketch(sketch):
+    levels = sketch['levels']
+    level = 0
+    while level < len(levels):
+        items = levels[level]
+        if len(items) <= sketch_capacity(level, len(levels)):
+            level += 1
+            continue
+        items = np.sort(items)
+        # Keep one item behind when the count is odd; alternate which half is
+        # promoted so the compaction error does not drift in one direction
+        keep = items[:len(items) % 2]
+        pairs = items[len(keep):]
+        offset = sketch['parity'] = 1 - sketch['parity']
+        if level + 1 == len(levels):
+            levels.append(np.empty(0))
+        levels[level + 1] = np.concatenate([levels[level + 1], pairs[offset::2]])
+        levels[level] = keep
+        level = 0
+    return sketch
+
+
+def amount_sketch(values):
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    sketch = {
+        'levels': [values],
+        'parity': 0,
+        'count': len(values),
+        'min': values.min() if len(values) else np.nan,
+        'max': values.max() if len(values) else np.nan,
+    }
+    return compress_sketch(sketch)
+
+
+def merge_sketches(total, part):
+    depth = max(len(total['levels']), len(part['levels']))
+    levels = [
+        np.concatenate([sketch['levels'][h] for sketch in (total, part) if h < len(sketch['levels'])])
+        for h in range(depth)
+    ]
+    return compress_sketch({
+        'levels': levels,
+        'parity': total['parity'],
+        'count': total['count'] + part['count'],
+        'min': np.fmin(total['min'], part['min']),
+        'max': np.fmax(total['max'], part['max']),
+    })
+
+
+def sketch_quantiles(sketch, quantiles):
+    items = np.concatenate(sketch['levels'])
+    weights = np.concatenate([np.full(len(items), 2 ** h) for h, items in enumerate(sketch['levels'])])
+    order = np.argsort(items)
+    items = items[order]
+    cumulative = np.cumsum(weights[order])
+    ranks = np.asarray(quantiles) * cumulative[-1]
+    return items[np.minimum(np.searchsorted(cumulative, ranks), len(items) - 1)]
+
+
+def group_sketches(df, column):
+    groups = df.groupby(column, observed=True, dropna=False)['Amount']
+    return {key: amount_sketch(values.to_numpy()) for key, values in groups}
+
+
+def merge_group_sketches(total, part):
+    merged = dict(total)
+    for key, sketch in part.items():
+        merged[key] = merge_sketches(merged[key], sketch) if key in merged else sketch
+    return merged
+
+
+def sketch_box_stats(sketch, label):
+    # Box plot statistics as used by matplotlib's bxp: quartiles from the sketch,
+    # whiskers at the most extreme retained amounts within 1.5 IQR of the box,
+    # and the retained amounts beyond them as outliers
+    q1, median, q3 = sketch_quantiles(sketch, [0.25, 0.5, 0.75])
+    iqr = q3 - q1
+    low_fence, high_fence = q1 - 1.5 * iqr, q3 + 1.5 * iqr
+    values = np.unique(np.concatenate(sketch['levels'] + [[sketch['min'], sketch['max']]]))
+    inside = values[(values >= low_fence) & (values <= high_fence)]
+    return {
+        'label': str(label),
+        'q1': q1,
+        'med': median,
+        'q3': q3,
+        'whislo': inside.min() if len(inside) else q1,
+        'whishi': inside.max() if len(inside) else q3,
+        'fliers': values[(values < low_fence) | (values > high_fence)],
+    }
+
+
+# --- Frequency tables (Step 3 count charts) ---
+# Counts of every categorical column, taken straight from the categorical codes
+# with np.bincount, so each column is counted once and the count charts draw
+# bar plots of these small tables instead of recounting the raw rows.
+def frequency_tables(df):
+    tables = {}
+    for column in CATEGORY_DTYPES:
+        values = df[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes = values.cat.codes.to_numpy()
+            counts = np.bincount(codes[codes >= 0], minlength=len(values.cat.categories))
+            table = pd.Series(counts, index=values.cat.categories.astype(object), name='count')
+            table = table[table > 0]
+        else:
+            table = values.value_counts()
+        tables[column] = table.rename_axis(column)
+    return tables
+
+
+def merge_frequency_tables(total, part):
+    return {column: total[column].add(part[column], fill_value=0).astype(np.int64) for column in total}
+
+
+def most_frequent(table, n=None):
+    table = table.sort_values(ascending=False, kind='stable')
+    return table if n is None else table.head(n)
+
+
+# --- Correlation engine (Step 5) ---
+# Step 5 correlates the monthly mean amount of every pair of categories, with
+# months in which a category has no transactions counted as 0. Instead of
+# pivoting the whole month x category matrix and calling .corr() each time,
+# the engine keeps the sufficient statistics of that matrix: the number of
+# months n, the per-category sums and the matrix of sums of squares and
+# cross-products. Adding a month is a rank-one update in O(categories^2), and
+# a month that receives late transactions is revised by subtracting its old
+# row before adding the new one, so history is never revisited. Each month's
+# current row is kept for that purpose (months x categories numbers).
+def empty_correlation_stats():
+    return {'categories': [], 'n': 0, 'sums': np.zeros(0), 'products': np.zeros((0, 0)), 'rows': {}}
+
+
+def month_category_means(month_category, months=None):
+    if months is not None:
+        month_category = month_category[month_category.index.get_level_values('YearMonth').isin(months)]
+    return (month_category['sum'] / month_category['count']).unstack(fill_value=0)
+
+
+def update_correlation_stats(stats, month_rows):
+    # Categories seen for the first time start with all-zero history
+    new_categories = [c for c in month_rows.columns if c not in set(stats['categories'])]
+    if new_categories:
+        size = len(stats['categories']) + len(new_categories)
+        stats['categories'] = stats['categories'] + new_categories
+        stats['sums'] = np.pad(stats['sums'], (0, len(new_categories)))
+        stats['products'] = np.pad(stats['products'], ((0, size - len(stats['products'])),) * 2)
+
+    size = len(stats['categories'])
+    values = month_rows.reindex(columns=stats['categories'], fill_value=0).to_numpy(dtype=np.float64)
+    for month, row in zip(month_rows.index, values):
+        old = stats['rows'].get(month)
+        if old is not None:
+            old = np.pad(old, (0, size - len(old)))
+            stats['n'] -= 1
+            stats['sums'] -= old
+            stats['products'] -= np.outer(old, old)
+        stats['n'] += 1
+        stats['sums'] += row
+        stats['products'] += np.outer(row, row)
+        stats['rows'][month] = row
+    return stats
+
+
+def update_correlation(aggregates, months=None):
+    # Rebuilds the statistics from every month the first time, then updates only the given months
+    if 'correlation' not in aggregates:
+        aggregates['correlation'] = empty_correlation_stats()
+        months = None
+    month_rows = month_category_means(aggregates['month_category'], months)
+    update_correlation_stats(aggregates['correlation'], month_rows)
+    return aggregates
+
+
+def correlation_matrix(stats):
+    n = stats['n']
+    sums = stats['sums']
+    covariance = n * stats['products'] - np.outer(sums, sums)
+    variance = np.diag(covariance).copy()
+    variance[variance <= 0] = np.nan
+    scale = np.sqrt(variance)
+    matrix = pd.DataFrame(covariance / np.outer(scale, scale),
+                          index=pd.Index(stats['categories'], name='Category'),
+                          columns=pd.Index(stats['categories'], name='Category'))
+    order = sorted(stats['categories'], key=str)
+    return matrix.loc[order, order].clip(-1, 1)
+
+
+# --- Rolling-window analytics (Step 4) ---
+# Trailing 7/30/90-day spend (sum, count and mean per transaction) for every
+# Category and every Mode. The daily totals of each group come from the cube
+# and are laid out as a dense day x group matrix, so all groups are handled in
+# one vectorized pass: with the running (cumulative) sums down the days, a
+# window's total is the difference of two rows of the running sums.
+# The state keeps the last max(window) - 1 days of daily totals. Appending days
+# after the last one only needs that tail, so a daily refresh costs
+# O((window + new days) x groups) no matter how long the history is; a batch
+# that reaches back before the last day rebuilds the state from the cube.
+ROLLING_WINDOWS = [7, 30, 90]
+ROLLING_GROUPS = ['Category', 'Mode']
+# Only these flows count as spend
+ROLLING_FLOWS = ['Expense']
+
+
+def daily_group_totals(cube, column, since=None):
+    spend = cube[cube.index.get_level_values('Income/Expense').isin(ROLLING_FLOWS)]
+    if since is not None:
+        spend = spend[spend.index.get_level_values('Day') >= since]
+    keys = [spend.index.get_level_values('Day'), spend.index.get_level_values(column)]
+    return spend[['sum', 'count']].groupby(keys, observed=True).sum()
+
+
+def empty_rolling_state():
+    return {'groups': [], 'last_day': None, 'sums': np.zeros((0, 0)), 'counts': np.zeros((0, 0), dtype=np.int64),
+            'table': None}
+
+
+def update_rolling_state(state, daily, column):
+    if daily.empty:
+        return state
+    new_groups = [g for g in daily.index.get_level_values(1).unique() if g not in set(state['groups'])]
+    if new_groups:
+        state['groups'] = state['groups'] + new_groups
+        state['sums'] = np.pad(state['sums'], ((0, 0), (0, len(new_groups))))
+        state['counts'] = np.pad(state['counts'], ((0, 0), (0, len(new_groups))))
+
+    daily_days = daily.index.get_level_values(0)
+    if state['last_day'] is None:
+        first_day = daily_days.min()
+    else:
+        first_day = state['last_day'] + pd.Timedelta(days=1)
+    days = pd.date_range(first_day, daily_days.max(), freq='D', name='Day')
+    new_sums = daily['sum'].unstack(fill_value=0).reindex(index=days, columns=state['groups'], fill_value=0)
+    new_counts = daily['count'].unstack(fill_value=0).reindex(index=days, columns=state['groups'], fill_value=0)
+
+    # Running sums over the kept tail followed by the new days, with a leading zero row
+    tail = len(state['sums'])
+    sums = np.vstack([state['sums'], new_sums.to_numpy(dtype=np.float64)])
+    counts = np.vstack([state['counts'], new_counts.to_numpy(dtype=np.int64)])
+    running_sums = np.vstack([np.zeros((1, sums.shape[1])), np.cumsum(sums, axis=0)])
+    running_counts = np.vstack([np.zeros((1, counts.shape[1]), dtype=np.int64), np.cumsum(counts, axis=0)])
+
+    ends = np.arange(tail, len(sums)) + 1
+    columns = {}
+    for window in ROLLING_WINDOWS:
+        starts = np.maximum(ends - window, 0)
+        window_sums = running_sums[ends] - running_sums[starts]
+        window_counts = running_counts[ends] - running_counts[starts]
+        columns[f'sum_{window}d'] = window_sums.ravel()
+        columns[f'count_{window}d'] = window_counts.ravel()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            columns[f'mean_{window}d'] = np.where(window_counts > 0, window_sums / window_counts, np.nan).ravel()
+
+    index = pd.MultiIndex.from_product([days, state['groups']], names=['Day', column])
+    table = pd.DataFrame(columns, index=index)
+    # Only days on which the group has spend in its longest window are kept
+    table = table[table[f'count_{max(ROLLING_WINDOWS)}d'].to_numpy() > 0]
+    state['table'] = table if state['table'] is None else pd.concat([state['table'], table])
+
+    keep = max(ROLLING_WINDOWS) - 1
+    state['sums'] = sums[-keep:]
+    state['counts'] = counts[-keep:]
+    state['last_day'] = days[-1]
+    return state
+
+
+def update_rolling(aggregates, days=None):
+    # Rebuilds every group's windows the first time (or when earlier days changed),
+    # otherwise only appends the given days after the last one seen
+    rolling = aggregates.setdefault('rolling', {})
+    cube = aggregates['cube']
+    for column in ROLLING_GROUPS:
+        state = rolling.get(column)
+        since = None if days is None or len(days) == 0 else min(days)
+        if state is None or since is None or state['last_day'] is None or since <= state['last_day']:
+            state = rolling[column] = empty_rolling_state()
+            since = None
+        update_rolling_state(state, daily_group_totals(cube, column, since), column)
+    return aggregates
+
+
+def latest_rolling_spend(state, window=30):
+    # The last day always has spend in some group, so it is in the table
+    latest = state['table'].xs(state['last_day'], level='Day')
+    return latest.sort_values(f'sum_{window}d', ascending=False)
+
+
+# --- Transfer matching (Step 4) ---
+# A transfer between two accounts can appear twice in the export: as a
+# Transfer-Out on the sending account and as Income on the receiving one.
+# Counting both inflates the totals, so every outgoing leg is paired with an
+# incoming leg of the same amount (to the cent) at most TRANSFER_MATCH_DAYS
+# days away. When the Transfer-Out's Category names an account the incoming
+# leg must be on that account; otherwise the incoming leg must name the sending
+# account as its own Category, since an equal amount arriving on some other
+# account (a salary, a refund) is not by itself evidence of a transfer.
+# Legs are cube cells (a day's transfers between the same accounts are netted),
+# so matching works the same in every mode. Pairs are found with sorted
+# merge_asof joins (O(n log n)); when two outgoing legs pick the same incoming
+# one the closer pair wins and the other is retried against the rest.
+TRANSFER_MATCH_DAYS = 3
+
+
+def transfer_legs(cube):
+    cells = cube.index.to_frame(index=False)
+    legs = pd.DataFrame({
+        'cell': np.arange(len(cube)),
+        'Day': cells['Day'],
+        'Mode': cells['Mode'].astype(str),
+        'Category': cells['Category'].astype(str),
+        'Flow': cells['Income/Expense'].astype(str),
+        'cents': np.round(cube['sum'].to_numpy() * 100).astype(np.int64),
+    })
+    return legs[legs['Flow'] == 'Transfer-Out'], legs[legs['Flow'] == 'Income']
+
+
+def asof_pairs(outgoing, incoming, by, max_days, other_account=False):
+    pairs = []
+    incoming = incoming.assign(in_day=incoming['Day']).sort_values('Day')
+    outgoing = outgoing.sort_values('Day')
+    while len(outgoing) and len(incoming):
+        matched = pd.merge_asof(outgoing, incoming, on='Day', by=by, direction='nearest',
+                                tolerance=pd.Timedelta(days=max_days), suffixes=('_out', '_in'))
+        matched = matched.dropna(subset=['cell_in'])
+        if other_account:
+            matched = matched[matched['Mode_out'] != matched['Mode_in']]
+        if matched.empty:
+            break
+        # Each incoming leg goes to its closest outgoing leg
+        matched['gap_days'] = (matched['in_day'] - matched['Day']).abs().dt.days
+        matched = matched.sort_values('gap_days', kind='stable').drop_duplicates('cell_in')
+        pairs.append(matched)
+        outgoing = outgoing[~outgoing['cell'].isin(matched['cell_out'])]
+        incoming = incoming[~incoming['cell'].isin(matched['cell_in'])]
+    return pairs
+
+
+def match_transfers(cube, max_days=TRANSFER_MATCH_DAYS):
+    outgoing, incoming = transfer_legs(cube)
+    accounts = set(cube.index.get_level_values('Mode').astype(str))
+    to_account = outgoing['Category'].isin(accounts)
+
+    # First to the named account, then the rest to incoming legs that name the sender
+    named = outgoing[to_account].rename(columns={'Category': 'account'})
+    pairs = asof_pairs(named, incoming.assign(account=incoming['Mode']), ['cents', 'account'], max_days)
+    matched_in = set(pd.concat(pairs)['cell_in']) if pairs else set()
+    pairs += asof_pairs(outgoing[~to_account].drop(columns='Category').assign(sender=outgoing['Mode']),
+                        incoming[~incoming['cell'].isin(matched_in)].rename(columns={'Category': 'sender'}),
+                        ['cents', 'sender'], max_days, other_account=True)
+    if pairs:
+        pairs = pd.concat(pairs, ignore_index=True)
+    else:
+        pairs = pd.DataFrame({
+            'Day': pd.Series(dtype='datetime64[ns]'), 'Mode_out': pd.Series(dtype=object),
+            'Mode_in': pd.Series(dtype=object), 'cents': pd.Series(dtype=np.int64),
+            'in_day': pd.Series(dtype='datetime64[ns]'), 'gap_days': pd.Series(dtype=np.int64),
+            'cell_out': pd.Series(dtype=np.int64), 'cell_in': pd.Series(dtype=np.int64),
+        })
+    return pd.DataFrame({
+        'out_day': pairs['Day'],
+        'from_account': pairs['Mode_out'],
+        'to_account': pairs['Mode_in'],
+        'amount': pairs['cents'] / 100,
+        'in_day': pairs['in_day'],
+        'gap_days': pairs['gap_days'],
+        'out_cell': pairs['cell_out'].astype(np.int64),
+        'in_cell': pairs['cell_in'].astype(np.int64),
+    }).sort_values('out_day', ignore_index=True)
+
+
+def exclude_matched_transfers(cube, pairs):
+    keep = np.ones(len(cube), dtype=bool)
+    keep[pairs['out_cell'].to_numpy()] = False
+    keep[pairs['in_cell'].to_numpy()] = False
+    return cube[keep]
+
+
+# --- Account ledger (Step 4) ---
+# Every payment Mode is an account. Income adds to its account, Expense and
+# Transfer-Out take from it, and a Transfer-Out whose Category names another
+# account (e.g. 'Saving Bank account 1' -> 'Recurring Deposit') also credits
+# that account, unless that account's own Income leg was matched to it (see
+# match_transfers); transfers to anything else leave the tracked accounts.
+# The signed movements come from the cube, netted per account and day. For
+# every account the ledger keeps the movement days, their amounts and the
+# running balance before every LEDGER_CHECKPOINT_EVERY-th movement, so the
+# balance as of any date is a binary search over the days plus a scan of at
+# most LEDGER_CHECKPOINT_EVERY movements instead of a sum over the history.
+# Balances start at 0: they are the net of all recorded flows, not bank
+# statements. Like the rolling windows, later days are appended and a batch
+# that reaches back before the last day rebuilds the ledger from the cube.
+FLOW_SIGNS = {'Income': 1.0, 'Expense': -1.0, 'Transfer-Out': -1.0}
+LEDGER_CHECKPOINT_EVERY = 64
+
+
+def account_movements(cube, accounts, pairs, since=None):
+    credit = np.ones(len(cube), dtype=bool)
+    credit[pairs['out_cell'].to_numpy()] = False
+    if since is not None:
+        recent = np.asarray(cube.index.get_level_values('Day') >= since)
+        cube = cube[recent]
+        credit = credit[recent]
+    days = cube.index.get_level_values('Day')
+    modes = cube.index.get_level_values('Mode').astype(str)
+    categories = cube.index.get_level_values('Category').astype(str)
+    flows = cube.index.get_level_values('Income/Expense').astype(str)
+    amounts = cube['sum'].to_numpy()
+    signs = np.nan_to_num(np.asarray(flows.map(FLOW_SIGNS), dtype=np.float64))
+
+    incoming = np.asarray((flows == 'Transfer-Out') & categories.isin(accounts)) & credit
+    movements = pd.DataFrame({
+        'Day': np.concatenate([days, days[incoming]]),
+        'Account': np.concatenate([modes, categories[incoming]]),
+        'Amount': np.concatenate([signs * amounts, amounts[incoming]]),
+    })
+    return movements.groupby(['Account', 'Day'])['Amount'].sum()
+
+
+def empty_ledger():
+    return {'accounts': {}, 'known_accounts': set(), 'last_day': None}
+
+
+def extend_checkpoints(account):
+    # Continue the running balance from the last checkpoint over the movements after it
+    start = (len(account['checkpoints']) - 1) * LEDGER_CHECKPOINT_EVERY
+    running = account['checkpoints'][-1] + np.concatenate([[0.0], np.cumsum(account['amounts'][start:])])
+    new_checkpoints = running[LEDGER_CHECKPOINT_EVERY::LEDGER_CHECKPOINT_EVERY]
+    account['checkpoints'] = np.concatenate([account['checkpoints'], new_checkpoints])
+
+
+def update_ledger_state(ledger, movements):
+    for name, moves in movements.groupby(level='Account'):
+        days = moves.index.get_level_values('Day').to_numpy().astype('datetime64[D]')
+        account = ledger['accounts'].setdefault(name, {
+            'days': np.zeros(0, dtype='datetime64[D]'),
+            'amounts': np.zeros(0),
+            'checkpoints': np.zeros(1),
+        })
+        account['days'] = np.concatenate([account['days'], days])
+        account['amounts'] = np.concatenate([account['amounts'], moves.to_numpy()])
+        extend_checkpoints(account)
+    if len(movements):
+        last_day = movements.index.get_level_values('Day').max()
+        ledger['last_day'] = last_day if ledger['last_day'] is None else max(ledger['last_day'], last_day)
+    return ledger
+
+
+def update_ledger(aggregates, days=None):
+    # Rebuilt the first time, when earlier days changed, when a new account
+    # appears (older transfers to it were not credited) or when a transfer
+    # already booked is now matched to a new incoming leg; otherwise appended
+    cube = aggregates['cube']
+    accounts = set(cube.index.get_level_values('Mode').astype(str).unique())
+    pairs = match_transfers(cube)
+    ledger = aggregates.get('ledger')
+    since = None if days is None or len(days) == 0 else min(days)
+    if (ledger is None or since is None or ledger['last_day'] is None or since <= ledger['last_day']
+            or accounts != ledger['known_accounts']
+            or ((pairs['out_day'] <= ledger['last_day']) & (pairs['in_day'] > ledger['last_day'])).any()):
+        ledger = aggregates['ledger'] = empty_ledger()
+        since = None
+    ledger['known_accounts'] = accounts
+    update_ledger_state(ledger, account_movements(cube, accounts, pairs, since))
+    return aggregates
+
+
+def account_balance(account, date):
+    # Movements up to and including the date; start from the checkpoint before them
+    count = np.searchsorted(account['days'], np.datetime64(pd.Timestamp(date), 'D'), side='right')
+    checkpoint = count // LEDGER_CHECKPOINT_EVERY
+    return account['checkpoints'][checkpoint] + account['amounts'][checkpoint * LEDGER_CHECKPOINT_EVERY:count].sum()
+
+
+def balances_as_of(ledger, date):
+    balances = {name: account_balance(account, date) for name, account in ledger['accounts'].items()}
+    return pd.Series(balances, name='Balance', dtype=np.float64).rename_axis('Mode')
+
+
+def running_balance(ledger, name):
+    account = ledger['accounts'][name]
+    return pd.Series(np.cumsum(account['amounts']), index=pd.DatetimeIndex(account['days'], name='Day'), name=name)
+
+
+# --- Recurring transactions (Step 4) ---
+# Subscriptions and other periodic payments repeat the same Subcategory, Note
+# and roughly the same Amount. Rows are keyed by (Subcategory, normalized Note,
+# Amount band) - the Note lower-cased with digits and punctuation removed, the
+# Amount on a log scale in bands RECURRING_AMOUNT_BAND apart.
+# Every key keeps a fixed-size summary instead of its list of days: first and
+# last day, number of distinct days, the amounts' sum and count, a histogram of
+# the gaps between consecutive days with its edges at the bands around the
+# calendar periods and, for every period, how many gaps were a whole number of
+# that period and how many payments those gaps skipped (a gap of k periods
+# means k - 1 missed payments). The table grows with the number of keys, not
+# with the history, and summaries merge by adding them up plus the one gap
+# between the earlier summary's last day and the later one's first day, so
+# detection also works on streamed and incremental aggregates. Batches of a key
+# that overlap in time (a back-dated batch) are merged approximately: the gaps
+# between their interleaved days cannot be recovered and are left out.
+# A key is recurring when it occurred at least RECURRING_MIN_OCCURRENCES times,
+# its median gap lies in a period's band (fewer than half the gaps below the
+# band and fewer than half above it) and most gaps fit that period; whole
+# periods that passed after the last payment up to the latest day in the data
+# are missed too, and a key with RECURRING_STOPPED_AFTER or more periods overdue
+# is reported as stopped.
+RECURRING_AMOUNT_BAND = 1.25
+RECURRING_MIN_OCCURRENCES = 4
+RECURRING_STOPPED_AFTER = 3
+RECURRING_MIN_PERIOD_DAYS = 7
+# Share of a period a payment may be early or late and still count as on time
+RECURRING_TOLERANCE = 0.25
+# Share of gaps that must be a whole number of periods
+RECURRING_MIN_FIT = 0.75
+RECURRING_PERIODS = {'weekly': 7.0, 'fortnightly': 14.0, 'monthly': 30.44, 'quarterly': 91.31, 'yearly': 365.25}
+RECURRING_KEYS = ['Subcategory', 'NoteKey', 'AmountBand']
+RECURRING_BANDS = {
+    name: (max(period * (1 - RECURRING_TOLERANCE), RECURRING_MIN_PERIOD_DAYS), period * (1 + RECURRING_TOLERANCE))
+    for name, period in RECURRING_PERIODS.items()
+}
+RECURRING_GAP_EDGES = np.array(sorted(edge for band in RECURRING_BANDS.values() for edge in band))
+RECURRING_GAP_COLUMNS = [f'gaps_{i}' for i in range(len(RECURRING_GAP_EDGES) + 1)]
+OCCURRENCE_DTYPES = {
+    'days': np.int64, 'sum': np.float64, 'count': np.int64,
+    **{column: np.int64 for column in RECURRING_GAP_COLUMNS},
+    **{f'fit_{name}': np.int64 for name in RECURRING_PERIODS},
+    **{f'missed_{name}': np.float64 for name in RECURRING_PERIODS},
+}
+OCCURRENCE_COUNTS = list(OCCURRENCE_DTYPES)
+
+
+def note_keys(notes):
+    # Notes repeat, so each distinct note is normalized once
+    codes, uniques = pd.factorize(notes)
+    keys = (pd.Series(uniques, dtype=object).astype(str).str.lower()
+            .str.replace(r'[\d\W_]+', ' ', regex=True).str.strip())
+    keys[keys == 'no note'] = ''
+    return pd.Categorical(np.where(codes >= 0, keys.to_numpy()[codes], ''))
+
+
+def amount_bands(amounts):
+    magnitude = np.maximum(np.abs(amounts.to_numpy()), 0.01)
+    return np.floor(np.log(magnitude) / np.log(RECURRING_AMOUNT_BAND)).astype(np.int16)
+
+
+def gap_fits(gaps, period):
+    ratio = gaps / period
+    whole = np.maximum(np.rint(ratio), 1)
+    fits = np.abs(ratio - whole) <= RECURRING_TOLERANCE
+    return fits, (whole - 1) * fits
+
+
+def fold_occurrences(index, first, last, counts):
+    # Pieces (single days or summaries) sorted by key and first day are folded
+    # into one summary per key; each piece adds its gap to the ones before it.
+    # Counts the pieces do not carry yet (e.g. the gaps of single days) are zero
+    new_key = np.ones(len(index), dtype=bool)
+    new_key[1:] = np.any([level[1:] != level[:-1] for level in index.codes], axis=0)
+    starts = np.flatnonzero(new_key)
+    group = np.cumsum(new_key) - 1
+    first_day = first.astype('datetime64[D]').astype(np.int64)
+    last_day = last.astype('datetime64[D]').astype(np.int64)
+    reached = pd.Series(last_day).groupby(group).cummax().to_numpy()
+    gaps = np.full(len(index), -1)
+    gaps[1:] = first_day[1:] - reached[:-1]
+    gaps[starts] = -1
+
+    n_keys = len(starts)
+    summary = {col: np.bincount(group, weights=values, minlength=n_keys) for col, values in counts.items()}
+    summary['days'] = summary['days'] - np.bincount(group, weights=gaps == 0, minlength=n_keys)
+    between = gaps > 0
+    bins = np.searchsorted(RECURRING_GAP_EDGES, gaps[between], side='right')
+    histogram = np.bincount(group[between] * len(RECURRING_GAP_COLUMNS) + bins,
+                            minlength=n_keys * len(RECURRING_GAP_COLUMNS)).reshape(n_keys, len(RECURRING_GAP_COLUMNS))
+    for i, col in enumerate(RECURRING_GAP_COLUMNS):
+        summary[col] = summary.get(col, 0) + histogram[:, i]
+    for name, period in RECURRING_PERIODS.items():
+        fits, missed = gap_fits(gaps[between], period)
+        summary[f'fit_{name}'] = summary.get(f'fit_{name}', 0) + np.bincount(group[between], fits, n_keys)
+        summary[f'missed_{name}'] = summary.get(f'missed_{name}', 0) + np.bincount(group[between], missed, n_keys)
+
+    summary = pd.DataFrame({
+        'first': first[starts],
+        'last': np.maximum.reduceat(last, starts) if len(starts) else last,
+        **{col: summary[col] for col in OCCURRENCE_COUNTS},
+    }, index=index[starts])
+    return summary.astype(OCCURRENCE_DTYPES)
+
+
+def occurrence_table(df):
+    dated = df.dropna(subset=['Date'])
+    keys = [
+        dated['Subcategory'],
+        pd.Series(note_keys(dated['Note']), index=dated.index, name='NoteKey'),
+        pd.Series(amount_bands(dated['Amount']), index=dated.index, name='AmountBand'),
+        day_keys(dated['Date']),
+    ]
+    # The grouped days come out sorted by key and day, each one a piece of its own
+    daily = dated.groupby(keys, observed=True)['Amount'].agg(['sum', 'count'])
+    day = daily.index.get_level_values('Day').to_numpy()
+    counts = {'days': np.ones(len(daily)), 'sum': daily['sum'].to_numpy(), 'count': daily['count'].to_numpy()}
+    return fold_occurrences(daily.index.droplevel('Day'), day, day, counts)
+
+
+def merge_occurrences(total, part):
+    pieces = pd.concat([total, part]).reset_index()
+    pieces = pieces.sort_values(RECURRING_KEYS + ['first'], kind='stable').set_index(RECURRING_KEYS)
+    counts = {col: pieces[col].to_numpy() for col in OCCURRENCE_COUNTS}
+    return fold_occurrences(pieces.index, pieces['first'].to_numpy(), pieces['last'].to_numpy(), counts)
+
+
+def detect_recurring(occurrences):
+    days = occurrences['days'].to_numpy()
+    histogram = occurrences[RECURRING_GAP_COLUMNS].to_numpy()
+    below = np.cumsum(histogram, axis=1)
+    gaps = below[:, -1]
+    last = occurrences['last'].to_numpy().astype('datetime64[D]').astype(np.int64)
+    as_of = last.max() if len(last) else 0
+
+    # The bands do not overlap, so at most one period holds a key's median gap
+    period = np.full(len(occurrences), np.nan)
+    label = np.full(len(occurrences), '', dtype=object)
+    missed_between = np.zeros(len(occurrences))
+    for name, days_per_period in RECURRING_PERIODS.items():
+        low, high = np.searchsorted(RECURRING_GAP_EDGES, RECURRING_BANDS[name])
+        # Gaps below the band fall in the bins up to its low edge, gaps above it after its high edge
+        in_band = (2 * below[:, low] < gaps) & (2 * (gaps - below[:, high]) < gaps)
+        fit = (in_band & (days >= RECURRING_MIN_OCCURRENCES)
+               & (occurrences[f'fit_{name}'].to_numpy() >= RECURRING_MIN_FIT * gaps))
+        period[fit] = days_per_period
+        label[fit] = name
+        missed_between[fit] = occurrences[f'missed_{name}'].to_numpy()[fit]
+
+    found = np.flatnonzero(~np.isnan(period))
+    period = period[found]
+    last = last[found]
+    overdue = np.maximum(np.floor((as_of - last) / period - RECURRING_TOLERANCE), 0)
+    keys = occurrences.index[found].to_frame(index=False)
+    return pd.DataFrame({
+        'Subcategory': keys['Subcategory'].astype(str),
+        'Note': keys['NoteKey'].astype(str),
+        'Amount': (occurrences['sum'].to_numpy()[found] / occurrences['count'].to_numpy()[found]).round(2),
+        'Period': label[found],
+        'Occurrences': days[found],
+        'Last': pd.to_datetime(last, unit='D'),
+        'NextExpected': pd.to_datetime(last + np.rint(period * (overdue + 1)), unit='D'),
+        'Missed': (missed_between[found] + overdue).astype(np.int64),
+        'Status': np.select([overdue >= RECURRING_STOPPED_AFTER, overdue > 0], ['stopped', 'overdue'], 'active'),
+    }).sort_values('NextExpected', ignore_index=True)
+
+
+# --- Anomaly detection (Step 3) ---
+# Unusual transactions are scored on log amounts (amounts are roughly
+# log-normal, which is why the boxplots use a log scale) in two ways:
+# - a robust modified z-score, 0.6745 * (x - median) / MAD, against the median
+#   and median absolute deviation of the transaction's Subcategory, falling back
+#   to its Category when the Subcategory has fewer than ANOMALY_MIN_GROUP rows.
+#   Both are read off the groups' Amount sketches (a weighted median of the
+#   retained items and of their deviations), so they merge with the other
+#   aggregates and need no history;
+# - a rolling z-score against the mean and standard deviation of the previous
+#   ANOMALY_WINDOW transactions of the same Subcategory (or Category), taken
+#   with grouped shift/rolling transforms over the rows sorted by group and
+#   date. The last ANOMALY_WINDOW log amounts of every group are kept as a
+#   mergeable aggregate, so a new batch continues the windows of its history.
+# Spreads below ANOMALY_MIN_SPREAD (10% in amount) are raised to it, so groups
+# with a fixed price such as a subscription do not flag every small change.
+# In incremental mode each batch is scored against the stored statistics before
+# it is merged into them, and its flagged rows are appended to anomalies.csv.
+ANOMALY_GROUPS = ['Subcategory', 'Category']
+ANOMALY_THRESHOLD = 3.5
+ANOMALY_MIN_GROUP = 10
+ANOMALY_MIN_SPREAD = np.log(1.1)
+ANOMALY_WINDOW = 30
+
+
+def log_amounts(amounts):
+    return np.log(np.maximum(np.abs(np.asarray(amounts, dtype=np.float64)), 0.01))
+
+
+def weighted_median(values, weights):
+    order = np.argsort(values)
+    values = values[order]
+    cumulative = np.cumsum(weights[order])
+    middle = np.searchsorted(cumulative, cumulative[-1] / 2)
+    # Exactly half the weight at or below an item: average it with the next one
+    if cumulative[middle] == cumulative[-1] / 2 and middle + 1 < len(values):
+        return (values[middle] + values[middle + 1]) / 2
+    return values[middle]
+
+
+def sketch_log_spread(sketch):
+    items = np.concatenate(sketch['levels'])
+    weights = np.concatenate([np.full(len(level), 2 ** h) for h, level in enumerate(sketch['levels'])])
+    logs = log_amounts(items)
+    median = weighted_median(logs, weights)
+    return median, weighted_median(np.abs(logs - median), weights)
+
+
+def group_log_stats(sketches):
+    rows = {key: (*sketch_log_spread(sketch), sketch['count'])
+            for key, sketch in sketches.items() if sketch['count']}
+    return pd.DataFrame.from_dict(rows, orient='index', columns=['median', 'mad', 'count'], dtype=np.float64)
+
+
+def lookup_groups(keys, table):
+    # Per-row values of a small per-group table, looked up through categorical codes
+    keys = keys if isinstance(keys.dtype, pd.CategoricalDtype) else keys.astype('category')
+    values = np.append(table.reindex(keys.cat.categories).to_numpy(dtype=np.float64), np.nan)
+    return values[keys.cat.codes.to_numpy()]
+
+
+def robust_z_scores(batch, logs, sketches):
+    z = np.full(len(batch), np.nan)
+    typical = np.full(len(batch), np.nan)
+    # Subcategory first; rows whose Subcategory is too small fall back to the Category
+    for column in ANOMALY_GROUPS:
+        stats = group_log_stats(sketches[column])
+        todo = np.isnan(z) & (lookup_groups(batch[column], stats['count']) >= ANOMALY_MIN_GROUP)
+        median = lookup_groups(batch[column], stats['median'])
+        mad = np.maximum(lookup_groups(batch[column], stats['mad']), ANOMALY_MIN_SPREAD)
+        z[todo] = (0.6745 * (logs - median) / mad)[todo]
+        typical[todo] = np.exp(median[todo])
+    return z, typical
+
+
+def amount_tails(df, tails=None):
+    # The last ANOMALY_WINDOW log amounts of every group, with their dates
+    dated = df.dropna(subset=['Date'])
+    result = {}
+    for column in ANOMALY_GROUPS:
+        rows = pd.DataFrame({column: dated[column].astype(str).to_numpy(), 'Date': dated['Date'].to_numpy(),
+                             'log': log_amounts(dated['Amount'])})
+        if tails is not None:
+            rows = pd.concat([tails[column], rows], ignore_index=True)
+        rows = rows.sort_values('Date', kind='stable')
+        result[column] = rows.groupby(column, sort=False).tail(ANOMALY_WINDOW).reset_index(drop=True)
+    return result
+
+
+def merge_amount_tails(total, part):
+    return {
+        column: (pd.concat([total[column], part[column]], ignore_index=True).sort_values('Date', kind='stable')
+                 .groupby(column, sort=False).tail(ANOMALY_WINDOW).reset_index(drop=True))
+        for column in total
+    }
+
+
+def rolling_z_scores(batch, logs, tails=None):
+    z = np.full(len(batch), np.nan)
+    for column in ANOMALY_GROUPS:
+        rows = pd.DataFrame({column: batch[column].astype(str).to_numpy(), 'Date': batch['Date'].to_numpy(),
+                             'log': logs, 'row': np.arange(len(batch))})
+        if tails is not None:
+            rows = pd.concat([tails[column].assign(row=-1), rows], ignore_index=True)
+        rows = rows.sort_values([column, 'Date'], kind='stable', ignore_index=True)
+
+        # Window statistics of the transactions before each one in its group
+        previous = rows.groupby(column, sort=False)['log'].shift(1)
+        window = previous.groupby(rows[column], sort=False).rolling(ANOMALY_WINDOW, min_periods=ANOMALY_MIN_GROUP)
+        mean = window.mean().reset_index(level=0, drop=True).sort_index().to_numpy()
+        std = np.maximum(window.std().reset_index(level=0, drop=True).sort_index().to_numpy(), ANOMALY_MIN_SPREAD)
+        scores = (rows['log'].to_numpy() - mean) / std
+
+        new = rows['row'].to_numpy() >= 0
+        order = rows['row'].to_numpy()[new]
+        column_z = np.full(len(batch), np.nan)
+        column_z[order] = scores[new]
+        todo = np.isnan(z)
+        z[todo] = column_z[todo]
+    return z
+
+
+def score_anomalies(batch, sketches, tails=None):
+    logs = log_amounts(batch['Amount'])
+    robust, typical = robust_z_scores(batch, logs, sketches)
+    rolling = rolling_z_scores(batch, logs, tails)
+    flagged = (np.abs(np.nan_to_num(robust)) > ANOMALY_THRESHOLD) | (np.abs(np.nan_to_num(rolling)) > ANOMALY_THRESHOLD)
+    scored = batch.loc[flagged, ['Date', 'Mode', 'Category', 'Subcategory', 'Note', 'Amount', 'Income/Expense']].copy()
+    scored['Typical'] = typical[flagged].round(2)
+    scored['RobustZ'] = robust[flagged].round(2)
+    scored['RollingZ'] = rolling[flagged].round(2)
+    return scored.sort_values('RobustZ', key=np.abs, ascending=False)
+
+
+def report_anomalies(anomalies, rows):
+    print(f"\nFlagged {len(anomalies)} of {rows} transactions as unusual "
+          f"(|robust z| or |rolling z| above {ANOMALY_THRESHOLD}); most unusual:")
+    if len(anomalies):
+        print(anomalies.head(10).to_string(index=False))
+
+
+# --- Mergeable aggregates ---
+# Everything the charts and tables need when the rows are not kept in memory.
+# Each part is built from a frame (or chunk, or batch) and merged part by part.
+# The correlation statistics are derived from 'month_category' by
+# update_correlation() once the parts are merged.
+def build_aggregates(df):
+    cube = build_cube(df)
+    return {
+        'cube': cube,
+        'month_category': cube_month_category(cube),
+        'amount_histogram': amount_histogram(df['Amount']),
+        'amount_sketches': {column: group_sketches(df, column) for column in SKETCH_GROUPS},
+        'frequencies': frequency_tables(df),
+        'occurrences': occurrence_table(df),
+        'amount_tails': amount_tails(df),
+    }
+
+
+def merge_sketch_tables(total, part):
+    return {column: merge_group_sketches(total[column], part[column]) for column in total}
+
+
+def merge_month_category(total, part):
+    return total.add(part, fill_value=0)
+
+
+AGGREGATE_MERGERS = {
+    'cube': merge_cubes,
+    'month_category': merge_month_category,
+    'amount_histogram': merge_histograms,
+    'amount_sketches': merge_sketch_tables,
+    'frequencies': merge_frequency_tables,
+    'occurrences': merge_occurrences,
+    'amount_tails': merge_amount_tails,
+}
+
+
+def merge_aggregates(total, part):
+    if total is None:
+        return part
+    merged = dict(total)
+    merged.update({key: merge(total[key], part[key]) for key, merge in AGGREGATE_MERGERS.items()})
+    return merged
+
+
+# --- Streaming ingest (Steps 1, 2, 4 and 5 chunk by chunk) ---
+# For very large ledger exports the CSV cannot be held in memory at once.
+# Each chunk is cleaned on its own and reduced to partial aggregates (the
+# aggregation cube and the amount histogram); only the merged aggregates are
+# kept between chunks.
+# Duplicates spanning two chunks are caught with 64-bit row hashes kept in
+# sorted numpy segments (8 bytes per distinct row) and probed with a binary
+# search, the same way as the incremental index below. A segment is merged with
+# the one before it once it has grown as large, so there are only
+# O(log(chunks)) segments and each hash is re-sorted O(log(chunks)) times.
+def add_hash_segment(segments, hashes):
+    segments.append(np.sort(hashes))
+    while len(segments) > 1 and len(segments[-2]) <= len(segments[-1]):
+        last = segments.pop()
+        segments[-1] = np.sort(np.concatenate([segments[-1], last]))
+    return segments
+
+
+def stream_transactions(path=DATA_FILE, chunksize=100_000, cache_dir=CACHE_DIR):
+    cache_file = cache_file_for(path, cache_dir, variant=f'chunk{chunksize}')
+    if cache_file and os.path.exists(cache_file):
+        print(f"\nStep 1: Streaming cleaned transactions from cache '{cache_file}'...")
+        yield from iter_cached_chunks(cache_file)
+        return
+
+    print(f"\nStep 1: Streaming '{path}' in chunks of {chunksize} rows...")
+    # Cleaned chunks are appended to the cache as Arrow record batches
+    writer = None
+    schema = None
+    seen_segments = []
+    quality = None
+    try:
+        reader = pd.read_csv(path, dtype=CATEGORY_DTYPES, chunksize=chunksize)
+    except FileNotFoundError:
+        print(f"Error: '{path}' not found. Please ensure the file is in the correct directory.")
+        exit()
+
+    with reader:
+        for chunk in reader:
+            # Note: missing 'Amount' values are filled with the mean of their own chunk here
+            chunk_quality = {}
+            chunk = clean_data(chunk, verbose=False, quality=chunk_quality)
+            # Drop rows already seen in an earlier chunk
+            hashes = pd.util.hash_pandas_object(chunk, index=False).to_numpy()
+            is_new = ~hashes_seen(seen_segments, hashes)
+            chunk_quality['duplicates'] += int((~is_new).sum())
+            quality = merge_data_quality(quality, chunk_quality)
+            add_hash_segment(seen_segments, hashes[is_new])
+            chunk = chunk[is_new]
+            if chunk.empty:
+                continue
+
+            if cache_file:
+                batch = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    # Each chunk has its own categories and the Arrow file format cannot
+                    # replace a dictionary between batches, so store plain strings
+                    schema = pa.schema([
+                        field.with_type(field.type.value_type) if pa.types.is_dictionary(field.type) else field
+                        for field in batch.schema
+                    ])
+                    writer = pa.ipc.new_file(cache_file + '.tmp', schema)
+                writer.write_table(batch.cast(schema))
+            yield chunk
+
+    if writer is not None:
+        writer.close()
+        os.replace(cache_file + '.tmp', cache_file)
+        prune_cache(cache_file)
+    if quality is not None:
+        print("\nStep 2: Data quality of the streamed chunks...")
+        report_data_quality(quality)
+        print(f"Streamed {quality['rows']} rows.")
+
+
+def load_aggregates_streaming(path=DATA_FILE, chunksize=100_000, cache_dir=CACHE_DIR, sql_store=None):
+    # An out-of-date SQL store is filled chunk by chunk in the same pass
+    fill_store = sql_store and not sql_store_is_current(sql_store, path)
+    aggregates_file = aggregates_file_for(path, cache_dir, variant=f'chunk{chunksize}')
+    if aggregates_file and os.path.exists(aggregates_file):
+        print(f"\nStep 1/2: Loading aggregates from cache '{aggregates_file}'...")
+        if fill_store:
+            build_sql_store(stream_transactions(path, chunksize, cache_dir), sql_store, path)
+        return pd.read_pickle(aggregates_file)
+
+    aggregates = None
+    with sql_store_writer(sql_store, path) if fill_store else nullcontext() as conn:
+        for chunk in stream_transactions(path, chunksize, cache_dir):
+            aggregates = merge_aggregates(aggregates, build_aggregates(chunk))
+            if conn is not None:
+                append_to_sql_store(conn, chunk)
+    if aggregates is not None:
+        update_ledger(update_rolling(update_correlation(aggregates)))
+    if aggregates_file and aggregates is not None:
+        save_pickle(aggregates, aggregates_file)
+        prune_cache(aggregates_file)
+    return aggregates
+
+
+# --- Incremental ingest with a persistent deduplication index ---
+# A daily feed only adds a few thousand rows, so re-reading and re-hashing the
+# whole history on every refresh is wasteful. The state directory keeps:
+#   index/hashes-NNNNNN.npy  sorted 64-bit hashes of every row already ingested,
+#                            one append-only segment per batch
+#   parts/batch-NNNNNN.arrow the new rows of each batch (when pyarrow is installed)
+#   aggregates.pkl           the aggregates (cube, histogram, ...) of the whole history
+# Segments are memory-mapped and probed with a binary search, so a batch costs
+# O(batch * log(history)) and only touches the pages it needs. Once there are
+# more than INDEX_SEGMENT_LIMIT segments they are merged into one.
+# Saving aggregates.pkl is the single commit point of a run. The run's segments
+# and parts are written under a '.pending' name and its SQL rows into a
+# 'pending_transactions' table tagged with a run id; aggregates.pkl records that
+# id and the pending file names, and only after it is saved are they renamed /
+# moved into place. Every run starts by finishing that step for the run recorded
+# in aggregates.pkl and discarding anything else that is pending: a run that
+# failed before saving leaves the state as it was (its rows are ingested again),
+# one that failed after saving is completed without counting its rows twice.
+def load_hash_segments(index_dir):
+    return [np.load(f, mmap_mode='r') for f in sorted(glob.glob(os.path.join(index_dir, 'hashes-*.npy')))]
+
+
+def hashes_seen(segments, hashes):
+    # Probing in sorted order keeps the binary searches on neighbouring pages
+    order = np.argsort(hashes)
+    probes = hashes[order]
+    seen = np.zeros(len(hashes), dtype=bool)
+    for segment in segments:
+        if len(segment) == 0:
+            continue
+        pos = np.searchsorted(segment, probes)
+        pos[pos == len(segment)] = 0
+        seen[order] |= segment[pos] == probes
+    return seen
+
+
+def roll_forward_pending(state_dir, committed):
+    files = set(committed['files']) if committed else set()
+    for f in glob.glob(os.path.join(state_dir, '*', '*' + PENDING_SUFFIX)):
+        if os.path.relpath(f, state_dir) in files:
+            os.replace(f, f[:-len(PENDING_SUFFIX)])
+        else:
+            os.remove(f)
+
+
+def roll_forward_sql(conn, committed):
+    pending = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' "
+                           "AND name = 'pending_transactions'").fetchone()
+    run = conn.execute("SELECT value FROM meta WHERE key = 'pending_run'").fetchone()
+    with conn:
+        if pending and run and committed and run[0] == committed['run']:
+            conn.execute("INSERT INTO transactions SELECT * FROM pending_transactions")
+        conn.execute("DROP TABLE IF EXISTS pending_transactions")
+        conn.execute("DELETE FROM meta WHERE key = 'pending_run'")
+
+
+def compact_hash_segments(index_dir, segments):
+    files = sorted(glob.glob(os.path.join(index_dir, 'hashes-*.npy')))
+    merged = np.unique(np.concatenate(segments))
+    with open(files[-1] + '.tmp', 'wb') as f:
+        np.save(f, merged)
+    del segments[:]
+    # The last segment is replaced by the merged one first: a failure part-way
+    # leaves hashes in two segments, never in none
+    os.replace(files[-1] + '.tmp', files[-1])
+    for f in files[:-1]:
+        os.remove(f)
+    return [np.load(files[-1], mmap_mode='r')]
+
+
+def ingest_incremental(path, state_dir, chunksize=None, sql_store=None):
+    print(f"\nStep 1/2: Incrementally ingesting '{path}' into '{state_dir}'...")
+    index_dir = os.path.join(state_dir, 'index')
+    parts_dir = os.path.join(state_dir, 'parts')
+    aggregates_file = os.path.join(state_dir, 'aggregates.pkl')
+    os.makedirs(index_dir, exist_ok=True)
+    os.makedirs(parts_dir, exist_ok=True)
+
+    aggregates = pd.read_pickle(aggregates_file) if os.path.exists(aggregates_file) else None
+    committed = aggregates and aggregates.get('committed_run')
+    roll_forward_pending(state_dir, committed)
+    segments = load_hash_segments(index_dir)
+    existing = sorted(glob.glob(os.path.join(index_dir, 'hashes-*.npy')))
+    batch_number = int(os.path.basename(existing[-1])[7:13]) + 1 if existing else 1
+
+    try:
+        if chunksize:
+            chunks = pd.read_csv(path, dtype=CATEGORY_DTYPES, chunksize=chunksize)
+        else:
+            chunks = [read_transactions(path)]
+    except FileNotFoundError:
+        print(f"Error: '{path}' not found. Please ensure the file is in the correct directory.")
+        exit()
+
+    run = str(time.time_ns())
+    conn = None
+    if sql_store:
+        conn = sqlite3.connect(sql_store)
+        conn.executescript(SQL_SCHEMA)
+        roll_forward_sql(conn, committed)
+        with conn:
+            conn.execute("CREATE TABLE pending_transactions AS SELECT * FROM transactions WHERE 0")
+            conn.execute("INSERT INTO meta VALUES ('pending_run', ?)", (run,))
+
+    rows_read = 0
+    rows_added = 0
+    touched_months = set()
+    touched_days = set()
+    anomalies = []
+    pending = []
+    quality = None
+    # A run's chunks follow each other in time and the run follows the history,
+    # so the recurring-payment summaries are merged in that order: the chunks
+    # first, the run into the history at the end (see fold_occurrences)
+    history_occurrences = aggregates and aggregates['occurrences']
+    run_occurrences = None
+    for chunk in chunks:
+        rows_read += len(chunk)
+        chunk_quality = {}
+        chunk = clean_data(chunk, verbose=False, quality=chunk_quality)
+        quality = merge_data_quality(quality, chunk_quality)
+        hashes = pd.util.hash_pandas_object(chunk, index=False).to_numpy()
+        is_new = ~hashes_seen(segments, hashes)
+        new_rows = chunk[is_new]
+        if new_rows.empty:
+            continue
+
+        rows_added += len(new_rows)
+        batch = build_aggregates(new_rows)
+        # Score the batch against the history's statistics before it joins them
+        history = aggregates or batch
+        anomalies.append(score_anomalies(new_rows, history['amount_sketches'],
+                                         aggregates and aggregates['amount_tails']))
+        touched_months.update(batch['month_category'].index.get_level_values('YearMonth').unique())
+        touched_days.update(batch['cube'].index.get_level_values('Day').unique())
+        aggregates = merge_aggregates(aggregates, batch)
+        run_occurrences = merge_occurrences(run_occurrences, batch['occurrences']) \
+            if run_occurrences is not None else batch['occurrences']
+        if pa is not None:
+            pending.append(os.path.join(parts_dir, f"batch-{batch_number:06d}.arrow{PENDING_SUFFIX}"))
+            write_cached_frame(new_rows, pending[-1])
+        if conn is not None:
+            sql_rows(new_rows).to_sql('pending_transactions', conn, if_exists='append', index=False,
+                                      chunksize=100_000)
+        segment = np.sort(hashes[is_new])
+        pending.append(os.path.join(index_dir, f"hashes-{batch_number:06d}.npy{PENDING_SUFFIX}"))
+        with open(pending[-1], 'wb') as f:
+            np.save(f, segment)
+        segments.append(segment)
+        batch_number += 1
+
+    if aggregates is not None:
+        if history_occurrences is not None and run_occurrences is not None:
+            aggregates['occurrences'] = merge_occurrences(history_occurrences, run_occurrences)
+        # Only the months this batch touched are folded into the correlation statistics
+        update_correlation(aggregates, touched_months)
+        # Days after the last one seen are appended to the trailing windows and the ledger
+        update_rolling(aggregates, touched_days)
+        update_ledger(aggregates, touched_days)
+        aggregates['committed_run'] = committed = {
+            'run': run,
+            'files': [os.path.relpath(f, state_dir) for f in pending],
+        }
+        save_pickle(aggregates, aggregates_file)
+    roll_forward_pending(state_dir, committed)
+    if conn is not None:
+        roll_forward_sql(conn, committed)
+        conn.close()
+    if len(segments) > INDEX_SEGMENT_LIMIT:
+        segments = compact_hash_segments(index_dir, segments)
+
+    if quality is not None:
+        print("\nData quality of the ingested file:")
+        report_data_quality(quality)
+    if anomalies:
+        anomalies = pd.concat(anomalies)
+        anomalies_file = os.path.join(state_dir, 'anomalies.csv')
+        anomalies.to_csv(anomalies_file, mode='a', header=not os.path.exists(anomalies_file), index=False)
+        report_anomalies(anomalies, rows_added)
+
+    history_rows = sum(len(segment) for segment in segments)
+    print(f"Read {rows_read} rows: appended {rows_added} new rows, "
+          f"skipped {rows_read - rows_added} duplicate or already ingested rows.")
+    print(f"History now holds {history_rows} distinct transactions.")
+    return aggregates
+
+
+# --- Embedded SQL store ---
+# The cleaned Step 2 table can be loaded once into a SQLite file so that new
+# questions are answered with a query instead of an edit to Steps 3-5 and a full
+# reload. Date parts are stored as their own columns ('YYYY-MM-DD' day,
+# 'YYYY-MM' month, integer year) and the indexes include 'amount', so the
+# monthly/daily/category roll-ups and filters such as "Food via Credit Card in
+# 2018" are answered from an index alone in milliseconds.
+# The 'meta' table records which source file (size and mtime) the store was
+# built from; a store that is still current is queried without reading the CSV.
+# In incremental mode each batch's new rows are appended to the store instead.
+SQL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    date TEXT, day TEXT, month TEXT, year INTEGER,
+    mode TEXT, category TEXT, subcategory TEXT, note TEXT,
+    amount REAL, flow TEXT, currency TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_month_category ON transactions (month, category, amount);
+CREATE INDEX IF NOT EXISTS idx_day ON transactions (day, amount);
+CREATE INDEX IF NOT EXISTS idx_category_mode_year ON transactions (category, mode, year, amount);
+CREATE INDEX IF NOT EXISTS idx_mode_day ON transactions (mode, day, amount);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+SQL_QUERIES = {
+    'monthly_totals': "SELECT month, SUM(amount) AS total FROM transactions "
+                      "WHERE month IS NOT NULL GROUP BY month ORDER BY month",
+    'daily_totals': "SELECT day, SUM(amount) AS total FROM transactions "
+                    "WHERE day IS NOT NULL GROUP BY day ORDER BY day",
+    'category_totals': "SELECT category, SUM(amount) AS total, COUNT(*) AS transactions FROM transactions "
+                       "GROUP BY category ORDER BY total DESC",
+    'month_category': "SELECT month, category, SUM(amount) AS total, COUNT(*) AS transactions, "
+                      "AVG(amount) AS mean FROM transactions WHERE month IS NOT NULL "
+                      "GROUP BY month, category ORDER BY month, category",
+}
+
+
+def sql_source_key(path):
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}:v{CACHE_VERSION}"
+
+
+def sql_store_is_current(db_path, path):
+    if not os.path.exists(db_path):
+        return False
+    try:
+        with sqlite3.connect(db_path) as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'source'").fetchone()
+        return row is not None and row[0] == sql_source_key(path)
+    except (sqlite3.Error, FileNotFoundError):
+        return False
+
+
+def sql_rows(df):
+    # Date parts are formatted with numpy datetime casts rather than strftime per row
+    dates = df['Date'].to_numpy().astype('datetime64[s]')
+    missing = np.isnat(dates)
+
+    def text(values):
+        values = values.astype(str).astype(object)
+        values[missing] = None
+        return values
+
+    year = dates.astype('datetime64[Y]').astype(np.int64) + 1970
+    return pd.DataFrame({
+        'date': text(dates),
+        'day': text(dates.astype('datetime64[D]')),
+        'month': text(dates.astype('datetime64[M]')),
+        'year': pd.array(np.where(missing, None, year), dtype='Int64'),
+        'mode': df['Mode'].astype(object).to_numpy(),
+        'category': df['Category'].astype(object).to_numpy(),
+        'subcategory': df['Subcategory'].astype(object).to_numpy(),
+        'note': df['Note'].astype(object).to_numpy(),
+        'amount': df['Amount'].to_numpy(),
+        'flow': df['Income/Expense'].astype(object).to_numpy(),
+        'currency': df['Currency'].astype(object).to_numpy(),
+    })
+
+
+def append_to_sql_store(conn, df):
+    sql_rows(df).to_sql('transactions', conn, if_exists='append', index=False, chunksize=100_000)
+
+
+@contextmanager
+def sql_store_writer(db_path, path):
+    # Rebuilt in a temporary file and swapped in, so readers never see a half-written store
+    tmp_path = db_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    with sqlite3.connect(tmp_path) as conn:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.executescript(SQL_SCHEMA)
+        yield conn
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('source', ?)", (sql_source_key(path),))
+        conn.execute("ANALYZE")
+        rows = conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+    conn.close()
+    os.replace(tmp_path, db_path)
+    print(f"Loaded {rows} cleaned transactions into the SQL store '{db_path}'.")
+
+
+def build_sql_store(frames, db_path, path):
+    with sql_store_writer(db_path, path) as conn:
+        for frame in frames:
+            append_to_sql_store(conn, frame)
+
+
+def query_sql_store(db_path, query, params=()):
+    query = SQL_QUERIES.get(query, query)
+    with sqlite3.connect(db_path) as conn:
+        result = pd.read_sql_query(query, conn, params=params)
+    conn.close()
+    return result
+
+
+def run_sql_query(db_path, query):
+    started = time.perf_counter()
+    result = query_sql_store(db_path, query)
+    print(f"\nQuery returned {len(result)} rows in {(time.perf_counter() - started) * 1000:.1f} ms:")
+    print(result.to_string(index=False))
+
+
+# --- Chart rendering ---
+# Every figure is drawn by a top-level plot function that only needs the small
+# piece of data it shows. The steps hand each chart to a `render` callback:
+# interactively that is show_chart, which draws and blocks on plt.show(); in
+# batch mode charts are drawn on a non-interactive backend in a process pool and
+# written to disk, so the whole report takes about as long as its slowest chart.
+# With --no-plots the callback is skip_chart and the plotting stack is never imported.
+def load_plotting(headless=False):
+    global plt, sns
+    if plt is None:
+        import matplotlib
+        if headless:
+            matplotlib.use('Agg')
+        import matplotlib.pyplot
+        import seaborn
+        plt = matplotlib.pyplot
+        sns = seaborn
+
+
+def show_chart(name, plot, *data):
+    with profile_stage(f'chart:{name}'):
+        load_plotting()
+        plot(*data)
+        plt.show()
+
+
+def skip_chart(name, plot, *data):
+    pass
+
+
+def save_chart(name, plot, data, output_dir):
+    records = []
+    with profile_stage(f'chart:{name}', records):
+        load_plotting(headless=True)
+        plot(*data)
+        path = os.path.join(output_dir, f"{name}.png")
+        plt.savefig(path, dpi=CHART_DPI)
+        plt.close('all')
+    return path, records[0]
+
+
+def start_batch_renderer(output_dir, jobs=None):
+    os.makedirs(output_dir, exist_ok=True)
+    pool = ProcessPoolExecutor(max_workers=jobs, initializer=load_plotting, initargs=(True,))
+    futures = []
+
+    def render(name, plot, *data):
+        futures.append(pool.submit(save_chart, name, plot, data, output_dir))
+
+    return pool, futures, render
+
+
+def finish_batch_renderer(pool, futures):
+    print(f"\nWaiting for {len(futures)} charts to finish rendering...")
+    for future in as_completed(futures):
+        path, record = future.result()
+        if PROFILE is not None:
+            PROFILE.append(record)
+        print(f"Saved chart '{path}'.")
+    pool.shutdown()
+
 
 # --- Step 3: Exploratory Data Analysis (EDA) ---
-print("\nStep 3: Exploratory Data Analysis (EDA)...")
-
-# Summary statistics
-print("\nSummary Statistics for Numerical Columns:")
-print(df.describe())
-
-# Distribution of transaction amounts
-plt.figure(figsize=(10, 6))
-sns.histplot(df['Amount'], bins=50, kde=True)
-plt.title('Distribution of Transaction Amounts')
-plt.xlabel('Amount (INR)')
-plt.ylabel('Frequency')
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-plt.show()
-
-# Transaction counts by Mode
-plt.figure(figsize=(12, 6))
-sns.countplot(data=df, x='Mode', order=df['Mode'].value_counts().index)
-plt.title('Transaction Counts by Mode of Payment')
-plt.xlabel('Payment Mode')
-plt.ylabel('Count')
-plt.xticks(rotation=45, ha='right')
-plt.tight_layout()
-plt.show()
-
-# Transaction counts by Category (top 10 for readability)
-plt.figure(figsize=(14, 7))
-top_categories = df['Category'].value_counts().index[:10]
-sns.countplot(data=df, x='Category', order=top_categories)
-plt.title('Top 10 Transaction Categories by Count')
-plt.xlabel('Category')
-plt.ylabel('Count')
-plt.xticks(rotation=45, ha='right')
-plt.tight_layout()
-plt.show()
-
-# Transaction counts by Income/Expense
-plt.figure(figsize=(8, 5))
-sns.countplot(data=df, x='Income/Expense', order=df['Income/Expense'].value_counts().index)
-plt.title('Transaction Counts by Income/Expense')
-plt.xlabel('Type')
-plt.ylabel('Count')
-plt.show()
-
-# Box plot of Amount by Category (top 5 for better visualization of outliers/spread)
-plt.figure(figsize=(12, 8))
-top_5_categories = df['Category'].value_counts().index[:5]
-sns.boxplot(data=df[df['Category'].isin(top_5_categories)], x='Amount', y='Category', order=top_5_categories)
-plt.title('Distribution of Amount by Top 5 Categories')
-plt.xlabel('Amount (INR)')
-plt.ylabel('Category')
-plt.xscale('log') # Use log scale for amount due to wide range/outliers
-plt.grid(axis='x', linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.show()
-
-# Box plot of Amount by Income/Expense
-plt.figure(figsize=(10, 6))
-sns.boxplot(data=df, x='Amount', y='Income/Expense')
-plt.title('Distribution of Amount by Income/Expense Type')
-plt.xlabel('Amount (INR)')
-plt.ylabel('Income/Expense')
-plt.xscale('log') # Use log scale for amount due to wide range/outliers
-plt.grid(axis='x', linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.show()
+def plot_amount_histogram(hist):
+    # Distribution of transaction amounts, drawn from the binned summary:
+    # the fine bins are regrouped into 50 display bins and the KDE is scaled to counts
+    centers, density = binned_kde(hist)
+    counts = hist['counts']
+    occupied = np.flatnonzero(counts)
+    low = (hist['offset'] + occupied[0]) * hist['width']
+    high = (hist['offset'] + occupied[-1] + 1) * hist['width']
+    display_width = (high - low) / 50
+    plt.figure(figsize=(10, 6))
+    sns.histplot(x=centers[occupied], weights=counts[occupied], bins=50, binrange=(low, high))
+    plt.plot(centers, density * counts.sum() * display_width, color='C0')
+    plt.title('Distribution of Transaction Amounts')
+    plt.xlabel('Amount (INR)')
+    plt.ylabel('Frequency')
+    plt.grid(axis='y', linestyle='--', alpha=0.7)
+
+
+def draw_counts(counts):
+    # Bar plot of a precomputed frequency table, in the table's order
+    sns.barplot(x=counts.index.astype(str), y=counts.to_numpy(), color='C0', errorbar=None)
+
+
+def plot_mode_counts(counts):
+    # Transaction counts by Mode
+    plt.figure(figsize=(12, 6))
+    draw_counts(counts)
+    plt.title('Transaction Counts by Mode of Payment')
+    plt.xlabel('Payment Mode')
+    plt.ylabel('Count')
+    plt.xticks(rotation=45, ha='right')
+    plt.tight_layout()
+
+
+def plot_top_category_counts(counts):
+    # Transaction counts by Category (top 10 for readability)
+    plt.figure(figsize=(14, 7))
+    draw_counts(counts)
+    plt.title('Top 10 Transaction Categories by Count')
+    plt.xlabel('Category')
+    plt.ylabel('Count')
+    plt.xticks(rotation=45, ha='right')
+    plt.tight_layout()
+
+
+def plot_income_expense_counts(counts):
+    # Transaction counts by Income/Expense
+    plt.figure(figsize=(8, 5))
+    draw_counts(counts)
+    plt.title('Transaction Counts by Income/Expense')
+    plt.xlabel('Type')
+    plt.ylabel('Count')
+
+
+def draw_boxplots(box_stats):
+    # Horizontal box plots from precomputed statistics, first group at the top like seaborn
+    ax = plt.gca()
+    if 'orientation' in inspect.signature(ax.bxp).parameters:
+        orientation = {'orientation': 'horizontal'}
+    else:
+        orientation = {'vert': False}
+    line = {'color': '0.26'}
+    ax.bxp(box_stats[::-1], patch_artist=True, boxprops={'facecolor': 'C0', 'edgecolor': '0.26'},
+           medianprops=line, whiskerprops=line, capprops=line,
+           flierprops={'markeredgecolor': '0.26'}, **orientation)
+
+
+def plot_top_category_boxplot(box_stats):
+    # Box plot of Amount by Category (top 5 for better visualization of outliers/spread)
+    plt.figure(figsize=(12, 8))
+    draw_boxplots(box_stats)
+    plt.title('Distribution of Amount by Top 5 Categories')
+    plt.xlabel('Amount (INR)')
+    plt.ylabel('Category')
+    plt.xscale('log') # Use log scale for amount due to wide range/outliers
+    plt.grid(axis='x', linestyle='--', alpha=0.7)
+    plt.tight_layout()
+
+
+def plot_income_expense_boxplot(box_stats):
+    # Box plot of Amount by Income/Expense
+    plt.figure(figsize=(10, 6))
+    draw_boxplots(box_stats)
+    plt.title('Distribution of Amount by Income/Expense Type')
+    plt.xlabel('Amount (INR)')
+    plt.ylabel('Income/Expense')
+    plt.xscale('log') # Use log scale for amount due to wide range/outliers
+    plt.grid(axis='x', linestyle='--', alpha=0.7)
+    plt.tight_layout()
+
+
+def explore_data(df, aggregates, render=show_chart):
+    print("\nStep 3: Exploratory Data Analysis (EDA)...")
+
+    if df is not None:
+        # Summary statistics
+        print("\nSummary Statistics for Numerical Columns:")
+        print(df.describe())
+    else:
+        print("\nSummary statistics skipped: the rows are not held in memory in this mode.")
+
+    # Every chart below is drawn from the mergeable aggregates, not from the raw rows
+    if aggregates['amount_histogram']['counts'].sum():
+        render('amount_histogram', plot_amount_histogram, aggregates['amount_histogram'])
+
+    frequencies = aggregates['frequencies']
+    render('mode_counts', plot_mode_counts, most_frequent(frequencies['Mode']))
+    render('top_category_counts', plot_top_category_counts, most_frequent(frequencies['Category'], 10))
+    render('income_expense_counts', plot_income_expense_counts, most_frequent(frequencies['Income/Expense']))
+
+    category_sketches = aggregates['amount_sketches']['Category']
+    top_5_categories = most_frequent(frequencies['Category'], 5).index
+    render('top_category_boxplot', plot_top_category_boxplot,
+           [sketch_box_stats(category_sketches[c], c) for c in top_5_categories])
+    type_sketches = aggregates['amount_sketches']['Income/Expense']
+    render('income_expense_boxplot', plot_income_expense_boxplot,
+           [sketch_box_stats(type_sketches[t], t) for t in sorted(type_sketches, key=str)])
+
+    # Unusual transactions need the rows; incremental mode scores each batch as it arrives
+    if df is not None:
+        report_anomalies(score_anomalies(df, aggregates['amount_sketches']), len(df))
+
 
 # --- Step 4: Time Series Analysis ---
-print("\nStep 4: Time Series Analysis...")
-
-# Create 'YearMonth' and 'DayOfWeek' for further analysis
-df['YearMonth'] = df['Date'].dt.to_period('M')
-df['DayOfWeek'] = df['Date'].dt.day_name()
-
-# Monthly trends of total amount
-monthly_data = df.groupby('YearMonth')['Amount'].sum().to_frame().reset_index()
-monthly_data['YearMonth'] = monthly_data['YearMonth'].astype(str) # Convert Period to string for plotting
-
-plt.figure(figsize=(14, 7))
-sns.lineplot(data=monthly_data, x='YearMonth', y='Amount', marker='o')
-plt.title('Monthly Total Transaction Amounts')
-plt.xlabel('Month')
-plt.ylabel('Total Amount (INR)')
-plt.xticks(rotation=45, ha='right')
-plt.grid(True, linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.show()
-
-# Daily trends of total amount
-daily_data = df.groupby(df['Date'].dt.date)['Amount'].sum().to_frame().reset_index()
-daily_data['Date'] = pd.to_datetime(daily_data['Date']) # Convert back to datetime for proper plotting
-
-plt.figure(figsize=(14, 7))
-sns.lineplot(data=daily_data, x='Date', y='Amount', marker='o', linewidth=1)
-plt.title('Daily Total Transaction Amounts')
-plt.xlabel('Date')
-plt.ylabel('Total Amount (INR)')
-plt.grid(True, linestyle='--', alpha=0.7)
-plt.tight_layout()
-plt.show()
+def plot_monthly_totals(monthly_data):
+    plt.figure(figsize=(14, 7))
+    sns.lineplot(data=monthly_data, x='YearMonth', y='Amount', marker='o')
+    plt.title('Monthly Total Transaction Amounts')
+    plt.xlabel('Month')
+    plt.ylabel('Total Amount (INR)')
+    plt.xticks(rotation=45, ha='right')
+    plt.grid(True, linestyle='--', alpha=0.7)
+    plt.tight_layout()
+
+
+def plot_daily_totals(daily_data):
+    plt.figure(figsize=(14, 7))
+    sns.lineplot(data=daily_data, x='Date', y='Amount', marker='o', linewidth=1)
+    plt.title('Daily Total Transaction Amounts')
+    plt.xlabel('Date')
+    plt.ylabel('Total Amount (INR)')
+    plt.grid(True, linestyle='--', alpha=0.7)
+    plt.tight_layout()
+
+
+def plot_rolling_spend(trailing):
+    plt.figure(figsize=(14, 7))
+    for category in trailing.columns:
+        plt.plot(trailing.index, trailing[category], label=category, linewidth=1)
+    plt.title('Trailing 30-Day Spend of the Top Categories')
+    plt.xlabel('Date')
+    plt.ylabel('Spend over the previous 30 days (INR)')
+    plt.legend()
+    plt.grid(True, linestyle='--', alpha=0.7)
+    plt.tight_layout()
+
+
+def plot_account_balances(balances):
+    plt.figure(figsize=(14, 7))
+    for account in balances.columns:
+        plt.plot(balances.index, balances[account], label=account, linewidth=1, drawstyle='steps-post')
+    plt.title('Running Balance of the Busiest Accounts')
+    plt.xlabel('Date')
+    plt.ylabel('Balance, net of all recorded flows (INR)')
+    plt.legend()
+    plt.grid(True, linestyle='--', alpha=0.7)
+    plt.tight_layout()
+
+
+def time_series_analysis(aggregates, render=show_chart, balance_as_of=None):
+    print("\nStep 4: Time Series Analysis...")
+
+    # Transfers recorded on both accounts are left out of the totals
+    pairs = match_transfers(aggregates['cube'])
+    cube = exclude_matched_transfers(aggregates['cube'], pairs)
+    if len(pairs):
+        print(f"\nMatched {len(pairs)} transfers between accounts ({pairs['amount'].sum():.2f} INR); "
+              "both legs are excluded from the totals below:")
+        print(pairs[['out_day', 'from_account', 'to_account', 'amount', 'in_day']].tail(10).to_string(index=False))
+    else:
+        print("\nNo transfers between accounts were recorded on both accounts.")
+
+    # Monthly trends of total amount
+    monthly_data = cube_monthly_totals(cube).rename('Amount').reset_index()
+    monthly_data['YearMonth'] = monthly_data['YearMonth'].astype(str) # Convert Period to string for plotting
+    print("\nMonthly total transaction amounts (last 12 months):")
+    print(monthly_data.tail(12).to_string(index=False))
+    render('monthly_totals', plot_monthly_totals, monthly_data)
+
+    # Daily trends of total amount
+    daily_data = cube_daily_totals(cube).rename('Amount').rename_axis('Date').reset_index()
+    render('daily_totals', plot_daily_totals, daily_data)
+
+    # Trailing 7/30/90-day spend per Category and per Mode
+    if 'rolling' not in aggregates:
+        update_rolling(aggregates)
+    for column in ROLLING_GROUPS:
+        state = aggregates['rolling'][column]
+        if state['table'] is None:
+            continue
+        spend_columns = [f'sum_{window}d' for window in ROLLING_WINDOWS]
+        print(f"\nTrailing spend by {column} as of {state['last_day']:%Y-%m-%d} (top 10 by 30-day spend):")
+        print(latest_rolling_spend(state)[spend_columns].head(10).round(2).to_string())
+    category_state = aggregates['rolling']['Category']
+    if category_state['table'] is not None:
+        top_categories = latest_rolling_spend(category_state).index[:5]
+        trailing = category_state['table']['sum_30d'].unstack()[top_categories].fillna(0)
+        render('rolling_category_spend', plot_rolling_spend, trailing)
+
+    # Subscriptions and other periodic payments
+    recurring = detect_recurring(aggregates['occurrences'])
+    live = recurring[recurring['Status'] != 'stopped']
+    print(f"\nRecurring transactions: {len(live)} active or overdue, "
+          f"{len(recurring) - len(live)} stopped. Next expected payments:")
+    print(live.to_string(index=False) if len(live) else "None found.")
+
+    # Running balance of every account (payment Mode)
+    if 'ledger' not in aggregates:
+        update_ledger(aggregates)
+    ledger = aggregates['ledger']
+    if ledger['last_day'] is not None:
+        as_of = ledger['last_day'] if balance_as_of is None else pd.Timestamp(balance_as_of)
+        print(f"\nAccount balances as of {as_of:%Y-%m-%d} (net of all recorded flows, starting from 0):")
+        print(balances_as_of(ledger, as_of).sort_values().round(2).to_string())
+        accounts = ledger['accounts']
+        busiest = sorted(accounts, key=lambda name: len(accounts[name]['days']), reverse=True)[:5]
+        balances = pd.concat([running_balance(ledger, name) for name in busiest], axis=1).sort_index()
+        render('account_balances', plot_account_balances, balances.ffill().fillna(0).loc[:as_of])
+
 
 # --- Step 5: Correlation Analysis ---
-print("\nStep 5: Correlation Analysis (by category counts and average amounts)...")
-
-# For correlation analysis between categories, it's more meaningful to look at:
-# 1. Frequency of categories over time, or
-# 2. Average/total amount spent per category.
-# The PDF's example of pivot_table with 'Amount' and then .corr() assumes that the categories become
-# numerical columns whose values can be correlated. This is not directly applicable if 'Category' itself is categorical.
-# Instead, we can look at the average amount per category and see if there are relationships,
-# or we can analyze the co-occurrence of categories if that's the intent.
-
-# Let's pivot to analyze average amounts per category over time (e.g., by month)
-# This will create a matrix where each column is a category and values are mean amounts.
-df_monthly_category_avg = df.set_index('Date').groupby([pd.Grouper(freq='M'), 'Category'])['Amount'].mean().unstack(fill_value=0)
-
-if not df_monthly_category_avg.empty and df_monthly_category_avg.shape[1] > 1:
-    correlation_matrix_avg_amount = df_monthly_category_avg.corr()
-
-    # Plot correlation heatmap for average amounts if there are enough categories
-    if correlation_matrix_avg_amount.shape[0] > 1:
-        plt.figure(figsize=(15, 12))
-        sns.heatmap(correlation_matrix_avg_amount, annot=True, cmap='coolwarm', fmt=".2f", linewidths=0.5)
-        plt.title('Correlation Heatmap of Monthly Average Transaction Amounts by Category')
-        plt.tight_layout()
-        plt.show()
-        print("\nCorrelation matrix for monthly average transaction amounts by category:")
-        print(correlation_matrix_avg_amount.head())
+# With hundreds of fine-grained categories, annotating every cell means one text
+# artist per cell and minutes of rendering. The 'clustered' heatmap mode keeps
+# the render time bounded: categories can be cut down to the top-K most strongly
+# correlated ones, are ordered by hierarchical clustering so related categories
+# sit together, the colour mesh is rasterized into a single image and only
+# off-diagonal cells with |r| >= the threshold get a text label.
+# The 'full' mode draws the original fully annotated heatmap.
+def top_correlated_categories(matrix, top_k):
+    strength = matrix.abs().where(~np.eye(len(matrix), dtype=bool)).max().fillna(0)
+    keep = strength.sort_values(ascending=False, kind='stable').index[:top_k]
+    return matrix.loc[keep, keep]
+
+
+def cluster_order(matrix):
+    values = np.nan_to_num(matrix.to_numpy(), nan=0.0)
+    if len(values) < 3:
+        return np.arange(len(values))
+    try:
+        from scipy.cluster.hierarchy import leaves_list, linkage
+        from scipy.spatial.distance import squareform
+    except ImportError:
+        # Without scipy, sorting by the leading eigenvector also places
+        # strongly correlated categories next to each other
+        _, vectors = np.linalg.eigh(values)
+        return np.argsort(vectors[:, -1], kind='stable')
+    distance = np.clip(1 - (values + values.T) / 2, 0, 2)
+    np.fill_diagonal(distance, 0)
+    return leaves_list(linkage(squareform(distance, checks=False), method='average'))
+
+
+def arrange_heatmap(matrix, top_k=None):
+    if top_k and len(matrix) > top_k:
+        matrix = top_correlated_categories(matrix, top_k)
+    order = cluster_order(matrix)
+    return matrix.iloc[order, order]
+
+
+def plot_correlation_heatmap(matrix, annotate_threshold=None):
+    plt.figure(figsize=(15, 12))
+    if annotate_threshold is None:
+        sns.heatmap(matrix, annot=True, cmap='coolwarm', fmt=".2f", linewidths=0.5)
     else:
-        print("\nNot enough categories or data points to generate a meaningful correlation heatmap for average amounts.")
-else:
-    print("\nCould not create a meaningful pivot table for correlation analysis of average amounts by category over time.")
+        ax = sns.heatmap(matrix, cmap='coolwarm', vmin=-1, vmax=1, rasterized=True,
+                         linewidths=0.5 if len(matrix) <= 50 else 0)
+        values = matrix.to_numpy()
+        rows, cols = np.nonzero((np.abs(np.nan_to_num(values)) >= annotate_threshold)
+                                & ~np.eye(len(values), dtype=bool))
+        fontsize = max(4, min(10, 400 / len(values)))
+        for row, col in zip(rows, cols):
+            ax.text(col + 0.5, row + 0.5, f"{values[row, col]:.2f}",
+                    ha='center', va='center', fontsize=fontsize)
+    plt.title('Correlation Heatmap of Monthly Average Transaction Amounts by Category')
+    plt.tight_layout()
+
+
+def plot_clustered_heatmap(matrix, top_k=None, annotate_threshold=HEATMAP_ANNOTATE_THRESHOLD):
+    # Selecting and clustering the categories is part of drawing the chart, so a
+    # run without plots never imports scipy or computes the ordering
+    plot_correlation_heatmap(arrange_heatmap(matrix, top_k), annotate_threshold)
+
+
+def correlation_analysis(aggregates, render=show_chart, heatmap='clustered', top_k=None,
+                         annotate_threshold=HEATMAP_ANNOTATE_THRESHOLD):
+    print("\nStep 5: Correlation Analysis (by category counts and average amounts)...")
+
+    # For correlation analysis between categories, it's more meaningful to look at:
+    # 1. Frequency of categories over time, or
+    # 2. Average/total amount spent per category.
+    # The PDF's example of pivot_table with 'Amount' and then .corr() assumes that the categories become
+    # numerical columns whose values can be correlated. This is not directly applicable if 'Category' itself is categorical.
+    # Instead, we can look at the average amount per category and see if there are relationships,
+    # or we can analyze the co-occurrence of categories if that's the intent.
+
+    # Let's pivot to analyze average amounts per category over time (e.g., by month)
+    # This will create a matrix where each column is a category and values are mean amounts.
+    # The mean is rebuilt from summed amounts and counts rather than from the raw rows.
+    # The correlation engine keeps the matrix's sufficient statistics up to date,
+    # so the correlations are read off them rather than recomputed from the pivot.
+    stats = aggregates['correlation']
+
+    if stats['n'] > 0 and len(stats['categories']) > 1:
+        correlation_matrix_avg_amount = correlation_matrix(stats)
+
+        # Plot correlation heatmap for average amounts if there are enough categories
+        if correlation_matrix_avg_amount.shape[0] > 1:
+            if heatmap == 'clustered':
+                render('correlation_heatmap', plot_clustered_heatmap,
+                       correlation_matrix_avg_amount, top_k, annotate_threshold)
+            else:
+                render('correlation_heatmap', plot_correlation_heatmap, correlation_matrix_avg_amount)
+            print("\nCorrelation matrix for monthly average transaction amounts by category:")
+            print(correlation_matrix_avg_amount.head())
+        else:
+            print("\nNot enough categories or data points to generate a meaningful correlation heatmap for average amounts.")
+    else:
+        print("\nCould not create a meaningful pivot table for correlation analysis of average amounts by category over time.")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Daily Household Transactions analysis")
+    parser.add_argument('csv', nargs='?', default=DATA_FILE, help="Path to the transactions CSV file")
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help="Stream the CSV in chunks of this many rows instead of loading it at once")
+    parser.add_argument('--cache-dir', default=CACHE_DIR,
+                        help="Directory for the cached cleaned table (requires pyarrow)")
+    parser.add_argument('--no-cache', action='store_true', help="Always re-parse and re-clean the CSV")
+    parser.add_argument('--state-dir', default=None,
+                        help="Incremental mode: append the CSV's unseen rows to the history kept in this directory")
+    parser.add_argument('--output-dir', default=None,
+                        help="Batch mode: render every chart headlessly and save it as a PNG in this directory")
+    parser.add_argument('--jobs', type=int, default=None,
+                        help="Number of processes used to render charts in batch mode (default: all cores)")
+    parser.add_argument('--no-plots', action='store_true',
+                        help="Analysis only: print statistics and tables without importing the plotting libraries")
+    parser.add_argument('--balance-as-of', default=None,
+                        help="Report the account balances as of this date (YYYY-MM-DD) instead of the last day")
+    parser.add_argument('--heatmap', choices=['clustered', 'full'], default='clustered',
+                        help="Correlation heatmap style: clustered and sparsely annotated, or every cell annotated")
+    parser.add_argument('--heatmap-top-k', type=int, default=None,
+                        help="Only show the K most strongly correlated categories in the clustered heatmap")
+    parser.add_argument('--heatmap-threshold', type=float, default=HEATMAP_ANNOTATE_THRESHOLD,
+                        help="Annotate clustered heatmap cells whose |correlation| is at least this")
+    parser.add_argument('--sql-store', default=None,
+                        help="Load the cleaned transactions into this SQLite file for indexed queries")
+    parser.add_argument('--query', default=None,
+                        help="Answer this SQL query (or one of: " + ', '.join(SQL_QUERIES)
+                             + ") from the SQL store instead of running Steps 3-5")
+    parser.add_argument('--profile', default=None,
+                        help="Write per-step timing and memory to this file (.json, otherwise CSV)")
+    args = parser.parse_args(argv)
+    if args.query and not args.sql_store:
+        parser.error("--query needs --sql-store")
+    return args
+
+
+def prepare_data(args, cache_dir):
+    # Returns the cleaned rows (None when they are never held in memory) and the mergeable aggregates
+    if args.state_dir:
+        # Incremental mode: only the new batch is read, the later steps use the stored aggregates
+        with profile_stage('incremental_ingest') as stage:
+            aggregates = ingest_incremental(args.csv, args.state_dir, args.chunksize, args.sql_store)
+            stage['frame'] = aggregates and aggregates['cube']
+        if aggregates is None:
+            print("\nNo transactions have been ingested yet.")
+        return None, aggregates
+
+    if args.chunksize:
+        # Streaming mode: only the aggregates are ever held in memory,
+        # so the row-level EDA charts of Step 3 are skipped.
+        with profile_stage('streaming_ingest') as stage:
+            aggregates = load_aggregates_streaming(args.csv, args.chunksize, cache_dir, args.sql_store)
+            stage['frame'] = aggregates and aggregates['cube']
+        if aggregates is None:
+            print("\nNo rows were read from the file.")
+        return None, aggregates
+
+    cache_file = cache_file_for(args.csv, cache_dir)
+    if cache_file and os.path.exists(cache_file):
+        print(f"\nStep 1/2: Loading cleaned transactions from cache '{cache_file}'...")
+        with profile_stage('load_cached') as stage:
+            df = stage['frame'] = read_cached_frame(cache_file)
+    else:
+        with profile_stage('load') as stage:
+            df = stage['frame'] = load_data(args.csv)
+
+        print("\nStep 2: Data Cleaning...")
+        with profile_stage('clean') as stage:
+            df = stage['frame'] = clean_data(df)
+        if cache_file:
+            with profile_stage('write_cache'):
+                write_cached_frame(df, cache_file)
+                prune_cache(cache_file)
+            print(f"Cleaned transactions cached to '{cache_file}'.")
+
+    if args.sql_store and not sql_store_is_current(args.sql_store, args.csv):
+        with profile_stage('sql_store'):
+            build_sql_store([df], args.sql_store, args.csv)
+
+    print("\nData types after cleaning:")
+    print(df.dtypes)
+    print("\nFirst 5 rows after cleaning:")
+    print(df.head())
+
+    # Create 'YearMonth' and 'DayOfWeek' for further analysis
+    df['YearMonth'] = df['Date'].dt.to_period('M')
+    df['DayOfWeek'] = df['Date'].dt.day_name()
+
+    aggregates_file = aggregates_file_for(args.csv, cache_dir)
+    if aggregates_file and os.path.exists(aggregates_file):
+        with profile_stage('load_aggregates') as stage:
+            aggregates = pd.read_pickle(aggregates_file)
+            stage['frame'] = aggregates['cube']
+    else:
+        with profile_stage('build_aggregates') as stage:
+            aggregates = update_ledger(update_rolling(update_correlation(build_aggregates(df))))
+            stage['frame'] = aggregates['cube']
+        if aggregates_file:
+            save_pickle(aggregates, aggregates_file)
+            prune_cache(aggregates_file)
+    return df, aggregates
+
+
+def main(argv=None):
+    global PROFILE
+    started = time.perf_counter()
+    args = parse_args(argv)
+    if args.profile:
+        PROFILE = []
+    cache_dir = None if args.no_cache else args.cache_dir
+    print("--- Project: Daily Household Transactions ---")
+    print(f"Libraries imported in {started - IMPORT_STARTED:.2f} s.")
+
+    # A current SQL store answers the query without reading the CSV at all
+    if args.query and not args.state_dir and sql_store_is_current(args.sql_store, args.csv):
+        run_sql_query(args.sql_store, args.query)
+        return
+
+    df, aggregates = prepare_data(args, cache_dir)
+    if args.query:
+        run_sql_query(args.sql_store, args.query)
+        return
+    if aggregates is None:
+        return
+
+    render = skip_chart if args.no_plots else show_chart
+    if args.output_dir and not args.no_plots:
+        pool, futures, render = start_batch_renderer(args.output_dir, args.jobs)
+    try:
+        with profile_stage('explore'):
+            explore_data(df, aggregates, render)
+        with profile_stage('time_series'):
+            time_series_analysis(aggregates, render, args.balance_as_of)
+        with profile_stage('correlation'):
+            correlation_analysis(aggregates, render, args.heatmap, args.heatmap_top_k, args.heatmap_threshold)
+    finally:
+        if args.output_dir and not args.no_plots:
+            finish_batch_renderer(pool, futures)
+
+    print(f"\nFinished in {time.perf_counter() - IMPORT_STARTED:.2f} s (plotting libraries loaded: {plt is not None}).")
+    if args.profile:
+        write_profile(PROFILE, args.profile)
+    print("\n--- Project Analysis Complete ---")
+
 
-print("\n--- Project Analysis Complete ---")
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+import argparse
+import os
+
+import pandas as pd
+
+import Daily_Household_Transactions as pipeline
+from generate_transactions import generate_ledger
+
+# --- Scaling benchmark ---
+# Generates synthetic ledgers of increasing size and times each pipeline step
+# on them, reporting throughput in rows/s so scaling curves can be tracked
+# between versions. Ledgers are generated once and reused on later runs.
+# Sizes above --max-in-memory rows only run the streaming ingest, which is the
+# mode meant for files that do not fit in memory.
+DEFAULT_SIZES = [1e4, 1e5, 1e6]
+
+
+def time_steps(path, rows, chunksize, in_memory=True):
+    records = []
+    if in_memory:
+        with pipeline.profile_stage('load', records) as stage:
+            df = stage['frame'] = pipeline.read_transactions(path)
+        with pipeline.profile_stage('clean', records) as stage:
+            df = stage['frame'] = pipeline.clean_data(df, verbose=False)
+        with pipeline.profile_stage('build_cube', records) as stage:
+            cube = stage['frame'] = pipeline.build_cube(df)
+        with pipeline.profile_stage('amount_histogram', records):
+            pipeline.amount_histogram(df['Amount'])
+        with pipeline.profile_stage('amount_sketches', records):
+            for column in pipeline.SKETCH_GROUPS:
+                pipeline.group_sketches(df, column)
+        with pipeline.profile_stage('frequency_tables', records):
+            pipeline.frequency_tables(df)
+        with pipeline.profile_stage('anomaly_scoring', records) as stage:
+            sketches = {column: pipeline.group_sketches(df, column) for column in pipeline.ANOMALY_GROUPS}
+            stage['frame'] = pipeline.score_anomalies(df, sketches)
+        with pipeline.profile_stage('recurring_detection', records) as stage:
+            occurrences = stage['frame'] = pipeline.occurrence_table(df)
+            pipeline.detect_recurring(occurrences)
+        with pipeline.profile_stage('time_series_rollups', records):
+            pipeline.cube_monthly_totals(cube)
+            pipeline.cube_daily_totals(cube)
+        with pipeline.profile_stage('rolling_windows', records):
+            pipeline.update_rolling({'cube': cube})
+        with pipeline.profile_stage('account_ledger', records):
+            pipeline.update_ledger({'cube': cube})
+        with pipeline.profile_stage('correlation', records):
+            aggregates = pipeline.update_correlation({'month_category': pipeline.cube_month_category(cube)})
+            pipeline.correlation_matrix(aggregates['correlation'])
+        del df, cube
+
+    with pipeline.profile_stage('streaming_ingest', records) as stage:
+        stage['frame'] = pipeline.load_aggregates_streaming(path, chunksize, cache_dir=None)['cube']
+
+    for record in records:
+        record['size'] = rows
+        record['rows_per_s'] = round(rows / record['wall_s']) if record['wall_s'] else None
+    return records
+
+
+def run_benchmark(sizes, data_dir, chunksize, max_in_memory, seed=0):
+    os.makedirs(data_dir, exist_ok=True)
+    results = []
+    for size in sizes:
+        rows = int(size)
+        path = os.path.join(data_dir, f"transactions_{rows}.csv")
+        if not os.path.exists(path):
+            print(f"\nGenerating {rows} rows into '{path}'...")
+            generate_ledger(rows, path, seed=seed)
+        print(f"\nBenchmarking {rows} rows...")
+        results.extend(time_steps(path, rows, chunksize, in_memory=rows <= max_in_memory))
+    return pd.DataFrame(results)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the transactions pipeline across ledger sizes")
+    parser.add_argument('--sizes', type=float, nargs='+', default=DEFAULT_SIZES,
+                        help="Ledger sizes in rows (e.g. 1e4 1e5 1e6 1e7 1e8)")
+    parser.add_argument('--data-dir', default='bench_data', help="Where the synthetic ledgers are kept")
+    parser.add_argument('--chunksize', type=int, default=500_000, help="Chunk size of the streaming ingest")
+    parser.add_argument('--max-in-memory', type=float, default=1e7,
+                        help="Largest size that is also benchmarked fully in memory")
+    parser.add_argument('--output', default='bench_results.csv', help="CSV file for the results")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run_benchmark(args.sizes, args.data_dir, args.chunksize, args.max_in_memory)
+    print("\nThroughput (rows/s) per step and ledger size:")
+    print(results.pivot(index='stage', columns='size', values='rows_per_s').to_string())
+    results.to_csv(args.output, index=False)
+    print(f"\nFull results written to '{args.output}'.")
+
+
+if __name__ == '__main__':
+    main()
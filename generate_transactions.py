@@ -0,0 +1,111 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from Daily_Household_Transactions import DATA_FILE
+
+# --- Synthetic ledger generator ---
+# Writes ledgers with the same columns and distributions as the real export so
+# the pipeline can be exercised at production scale (10^4 to 10^8 rows):
+# - Mode/Category/Subcategory/Note/Income/Expense/Currency are resampled as whole
+#   rows from the source file, which keeps their joint mix and missing values
+# - Amount is the sampled row's amount with log-normal jitter
+# - Dates are spread over the source's date range and written in the same share
+#   of 'DD/MM/YYYY HH:MM:SS' and bare 'D/M/YYYY' layouts; like the source, some
+#   bare dates zero-pad the month ('1/9/2018' next to '13/09/2018')
+# - Exact duplicate rows are injected at the source file's duplicate rate
+# Rows are generated and appended in chunks, so memory stays flat at any size.
+GENERATOR_CHUNK_ROWS = 1_000_000
+
+
+def source_profile(source=DATA_FILE):
+    rows = pd.read_csv(source, dtype=str, keep_default_na=False, na_values=[''])
+    amounts = pd.to_numeric(rows['Amount'], errors='coerce').fillna(0).to_numpy()
+    dates = pd.to_datetime(rows['Date'], format='%d/%m/%Y %H:%M:%S', errors='coerce')
+    dates = dates.fillna(pd.to_datetime(rows['Date'], format='%d/%m/%Y', errors='coerce'))
+    # Among bare dates with a single-digit month, the share written as '0M'
+    bare_months = rows['Date'][rows['Date'].str.len() <= 10].str.split('/').str[1]
+    short_months = bare_months[bare_months.str.lstrip('0').str.len() == 1]
+    return {
+        'rows': rows.drop(columns=['Date', 'Amount']).reset_index(drop=True),
+        'columns': list(rows.columns),
+        'amounts': amounts,
+        'bare_date_share': float((rows['Date'].str.len() <= 10).mean()),
+        'padded_month_share': float((short_months.str.len() == 2).mean()) if len(short_months) else 0.0,
+        'duplicate_rate': float(rows.duplicated().mean()),
+        'start': dates.min(),
+        'end': dates.max(),
+    }
+
+
+def format_dates(timestamps, bare, padded):
+    dates = pd.Series(pd.to_datetime(timestamps, unit='s'))
+    months = dates.dt.month.astype(str)
+    months = np.where(padded, months.str.zfill(2), months)
+    short = dates.dt.day.astype(str) + '/' + months + '/' + dates.dt.year.astype(str)
+    return pd.Series(np.where(bare, short, dates.dt.strftime('%d/%m/%Y %H:%M:%S')))
+
+
+def generate_chunk(profile, n, rng, duplicate_rate=None, bare_date_share=None):
+    duplicate_rate = profile['duplicate_rate'] if duplicate_rate is None else duplicate_rate
+    bare_date_share = profile['bare_date_share'] if bare_date_share is None else bare_date_share
+
+    picks = rng.integers(0, len(profile['rows']), n)
+    chunk = profile['rows'].iloc[picks].reset_index(drop=True)
+
+    start = profile['start'].value // 10 ** 9
+    end = profile['end'].value // 10 ** 9
+    timestamps = np.sort(rng.integers(start, end + 1, n))[::-1]  # newest first, like the export
+    padded = rng.random(n) < profile['padded_month_share']
+    chunk['Date'] = format_dates(timestamps, rng.random(n) < bare_date_share, padded).to_numpy()
+
+    amounts = profile['amounts'][picks] * rng.lognormal(0.0, 0.25, n)
+    chunk['Amount'] = np.maximum(np.round(amounts, 2), 1.0)
+
+    # Copy some rows over later rows to reproduce the export's exact duplicates
+    duplicates = np.flatnonzero(rng.random(n) < duplicate_rate)
+    duplicates = duplicates[duplicates > 0]
+    if len(duplicates):
+        originals = rng.integers(0, duplicates)
+        chunk.iloc[duplicates] = chunk.iloc[originals].to_numpy()
+    return chunk[profile['columns']]
+
+
+def generate_ledger(rows, output, source=DATA_FILE, seed=0, duplicate_rate=None, bare_date_share=None):
+    profile = source_profile(source)
+    rng = np.random.default_rng(seed)
+    written = 0
+    while written < rows:
+        n = min(GENERATOR_CHUNK_ROWS, rows - written)
+        chunk = generate_chunk(profile, n, rng, duplicate_rate, bare_date_share)
+        chunk.to_csv(output, mode='w' if written == 0 else 'a', header=written == 0, index=False)
+        written += n
+    return written
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic household transactions ledger")
+    parser.add_argument('rows', type=float, help="Number of rows to generate (e.g. 1e6)")
+    parser.add_argument('output', help="Path of the CSV file to write")
+    parser.add_argument('--source', default=DATA_FILE, help="Real ledger whose distributions are reproduced")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed")
+    parser.add_argument('--duplicate-rate', type=float, default=None,
+                        help="Share of exact duplicate rows (default: same as the source)")
+    parser.add_argument('--bare-date-share', type=float, default=None,
+                        help="Share of dates written as bare D/M/YYYY (default: same as the source)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    started = time.perf_counter()
+    rows = generate_ledger(int(args.rows), args.output, args.source, args.seed,
+                           args.duplicate_rate, args.bare_date_share)
+    elapsed = time.perf_counter() - started
+    print(f"Wrote {rows} synthetic transactions to '{args.output}' in {elapsed:.1f} s.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+import argparse
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import Daily_Household_Transactions as pipeline
+
+# --- Multi-household batch processing ---
+# Runs the load/clean/aggregate pipeline (Steps 1, 2 and the mergeable
+# aggregates) over a directory or glob of household ledgers in a process pool.
+# Every household gets its own output folder with its aggregates and monthly
+# totals; the households' aggregates are merged into one combined rollup.
+# Ledgers are handed to the workers in batches and each worker merges its
+# batch's aggregates itself, so only one partial rollup per batch travels back
+# to the parent process and the parent's merging stays small next to the
+# per-household work. A ledger that fails to load is reported in the summary
+# instead of stopping the nightly run.
+FLOWS = ['Income', 'Expense', 'Transfer-Out']
+SUMMARY_COLUMNS = ['household', 'rows_read', 'transactions', 'first_day', 'last_day'] + FLOWS + ['error']
+# Parts of a household's aggregates that only make sense within the household:
+# account balances and transfers, recurring-payment gaps and the anomaly windows
+# are keyed by account, Note or Subcategory, not by household, so merging them
+# would mix the 'Cash' or the 'Netflix' payments of different households.
+# The rollup merges only the other parts
+HOUSEHOLD_ONLY = ['ledger', 'occurrences', 'amount_tails']
+ROLLUP_MERGERS = {key: merge for key, merge in pipeline.AGGREGATE_MERGERS.items() if key not in HOUSEHOLD_ONLY}
+# Batches per worker process: more batches balance uneven ledger sizes better,
+# fewer keep the parent's merging cheaper
+BATCHES_PER_JOB = 4
+
+
+def find_ledgers(source):
+    if os.path.isdir(source):
+        source = os.path.join(source, '*.csv')
+    return sorted(glob.glob(source))
+
+
+def household_names(paths):
+    # Ledgers are named after their file; files sharing a name in different
+    # folders get the folder prepended so their outputs do not collide
+    stems = [os.path.splitext(os.path.basename(path))[0] for path in paths]
+    clashes = {stem for stem in stems if stems.count(stem) > 1}
+    return [
+        os.path.basename(os.path.dirname(os.path.abspath(path))) + '__' + stem if stem in clashes else stem
+        for path, stem in zip(paths, stems)
+    ]
+
+
+def write_household_outputs(aggregates, output_dir):
+    os.makedirs(output_dir, exist_ok=True)
+    pipeline.save_pickle(aggregates, os.path.join(output_dir, 'aggregates.pkl'))
+    pipeline.cube_monthly_totals(aggregates['cube']).to_csv(os.path.join(output_dir, 'monthly_totals.csv'))
+    category_totals = aggregates['cube']['sum'].groupby(level='Category', observed=True).sum()
+    category_totals.sort_values(ascending=False).to_csv(os.path.join(output_dir, 'category_totals.csv'))
+
+
+def household_summary(name, rows_read, aggregates):
+    cube = aggregates['cube']
+    flows = cube['sum'].groupby(level='Income/Expense', observed=True).sum()
+    days = cube.index.get_level_values('Day')
+    summary = {
+        'household': name,
+        'rows_read': rows_read,
+        'transactions': int(cube['count'].sum()),
+        'first_day': days.min(),
+        'last_day': days.max(),
+    }
+    summary.update({flow: float(flows.get(flow, 0.0)) for flow in FLOWS})
+    return summary
+
+
+def merge_rollup(total, part):
+    if total is None:
+        return {key: part[key] for key in ROLLUP_MERGERS}
+    return {key: merge(total[key], part[key]) for key, merge in ROLLUP_MERGERS.items()}
+
+
+def process_household(path, name, output_dir):
+    df = pipeline.read_transactions(path)
+    rows_read = len(df)
+    df = pipeline.clean_data(df, verbose=False)
+    aggregates = pipeline.build_aggregates(df)
+    aggregates = pipeline.update_ledger(pipeline.update_rolling(pipeline.update_correlation(aggregates)))
+    write_household_outputs(aggregates, os.path.join(output_dir, 'households', name))
+    return household_summary(name, rows_read, aggregates), aggregates
+
+
+def process_batch(batch, output_dir):
+    summaries = []
+    rollup = None
+    for path, name in batch:
+        try:
+            summary, aggregates = process_household(path, name, output_dir)
+            # A ledger without dated transactions (e.g. header only) adds nothing to the rollup
+            if summary['transactions']:
+                rollup = merge_rollup(rollup, aggregates)
+        except Exception as error:
+            summaries.append({'household': name, 'error': f"{type(error).__name__}: {error}"})
+            continue
+        summaries.append(summary)
+    return summaries, rollup
+
+
+def process_households(paths, output_dir, jobs=None):
+    jobs = jobs or os.cpu_count() or 1
+    households = list(zip(paths, household_names(paths)))
+    n_batches = min(len(households), jobs * BATCHES_PER_JOB)
+    batches = [households[i::n_batches] for i in range(n_batches)]
+
+    summaries = []
+    rollup = None
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(process_batch, batch, output_dir) for batch in batches]
+        for future in as_completed(futures):
+            batch_summaries, batch_rollup = future.result()
+            if batch_rollup is not None:
+                try:
+                    rollup = merge_rollup(rollup, batch_rollup)
+                except Exception as error:
+                    # The batch's own outputs are written; only its share of the rollup is lost
+                    for summary in batch_summaries:
+                        if 'error' not in summary:
+                            summary['error'] = f"rollup: {type(error).__name__}: {error}"
+            summaries.extend(batch_summaries)
+
+    summary = pd.DataFrame(summaries).reindex(columns=SUMMARY_COLUMNS).sort_values('household', ignore_index=True)
+    summary[['rows_read', 'transactions']] = summary[['rows_read', 'transactions']].astype('Int64')
+    if rollup is not None:
+        # Correlation statistics and trailing windows are rebuilt from the merged tables;
+        # the rollup has no ledger (each household's own is in its aggregates)
+        rollup = pipeline.update_rolling(pipeline.update_correlation(rollup))
+    return summary, rollup
+
+
+def write_rollup(summary, rollup, output_dir):
+    os.makedirs(output_dir, exist_ok=True)
+    summary.to_csv(os.path.join(output_dir, 'households.csv'), index=False)
+    if rollup is not None:
+        pipeline.save_pickle(rollup, os.path.join(output_dir, 'rollup_aggregates.pkl'))
+        pipeline.cube_monthly_totals(rollup['cube']).to_csv(os.path.join(output_dir, 'rollup_monthly_totals.csv'))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the transactions pipeline over many household ledgers")
+    parser.add_argument('source', help="Directory of ledger CSV files, or a glob such as 'ledgers/*/2024-*.csv'")
+    parser.add_argument('--output-dir', default='household_outputs',
+                        help="Where the per-household outputs and the combined rollup are written")
+    parser.add_argument('--jobs', type=int, default=None, help="Number of worker processes (default: all cores)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    paths = find_ledgers(args.source)
+    if not paths:
+        print(f"No ledger files match '{args.source}'.")
+        return
+    print(f"Processing {len(paths)} household ledgers...")
+    started = time.perf_counter()
+    summary, rollup = process_households(paths, args.output_dir, args.jobs)
+    write_rollup(summary, rollup, args.output_dir)
+    elapsed = time.perf_counter() - started
+
+    failed = summary['error'].notna()
+    print(f"Processed {len(paths) - failed.sum()} ledgers in {elapsed:.1f} s "
+          f"({len(paths) / elapsed:.1f} ledgers/s); {failed.sum()} failed.")
+    if failed.any():
+        print(summary.loc[failed, ['household', 'error']].to_string(index=False))
+    if rollup is not None:
+        print("\nCombined monthly totals (last 12 months):")
+        print(pipeline.cube_monthly_totals(rollup['cube']).tail(12))
+    print(f"\nPer-household outputs and the combined rollup written to '{args.output_dir}'.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import Daily_Household_Transactions as pipeline
+import generate_transactions
+
+# Synthetic ledger drawn from the bundled export (same columns, category mix,
+# date formats and duplicate rate), cleaned once and shared by the tests
+LEDGER_ROWS = 6000
+
+
+@pytest.fixture(scope='session')
+def transactions(tmp_path_factory):
+    path = tmp_path_factory.mktemp('ledger') / 'ledger.csv'
+    generate_transactions.generate_ledger(LEDGER_ROWS, path, source=os.path.join(ROOT, pipeline.DATA_FILE), seed=7)
+    df = pipeline.clean_data(pipeline.read_transactions(str(path)), verbose=False)
+    return df.dropna(subset=['Date']).reset_index(drop=True)
+
+
+def split_by_date(df, share=0.7):
+    # History and a later batch, cut at a day boundary
+    cutoff = df['Date'].dt.floor('D').quantile(share).floor('D')
+    older = df[df['Date'] < cutoff].reset_index(drop=True)
+    newer = df[df['Date'] >= cutoff].reset_index(drop=True)
+    return older, newer
+
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+import Daily_Household_Transactions as pipeline
+from conftest import split_by_date
+
+
+def loop_rolling_z(df):
+    # Each row against the previous ANOMALY_WINDOW rows of its Subcategory (else Category), group by group
+    logs = pipeline.log_amounts(df['Amount'])
+    z = np.full(len(df), np.nan)
+    for column in pipeline.ANOMALY_GROUPS:
+        keys = df[column].astype(str).to_numpy()
+        for key in np.unique(keys):
+            rows = np.flatnonzero(keys == key)
+            rows = rows[np.argsort(df['Date'].to_numpy()[rows], kind='stable')]
+            for position, row in enumerate(rows):
+                previous = logs[rows[max(0, position - pipeline.ANOMALY_WINDOW):position]]
+                if np.isnan(z[row]) and len(previous) >= pipeline.ANOMALY_MIN_GROUP:
+                    spread = max(np.std(previous, ddof=1), pipeline.ANOMALY_MIN_SPREAD)
+                    z[row] = (logs[row] - previous.mean()) / spread
+    return z
+
+
+def test_exact_sketches_give_pandas_median_and_mad(transactions):
+    logs = pd.Series(pipeline.log_amounts(transactions['Amount']), index=transactions.index)
+    for column in pipeline.ANOMALY_GROUPS:
+        sketches = pipeline.group_sketches(transactions, column)
+        stats = pipeline.group_log_stats(sketches)
+        # Groups that never compacted hold every amount, so their statistics are exact
+        exact = [key for key, sketch in sketches.items() if len(sketch['levels']) == 1 and sketch['count']]
+        assert len(exact) > 5
+        groups = logs.groupby(transactions[column], observed=True)
+        median = groups.median()
+        mad = groups.apply(lambda values: (values - values.median()).abs().median())
+        np.testing.assert_allclose(stats.loc[exact, 'median'], median.loc[exact], atol=1e-12)
+        np.testing.assert_allclose(stats.loc[exact, 'mad'], mad.loc[exact], atol=1e-12)
+        np.testing.assert_array_equal(stats.loc[exact, 'count'], groups.size().loc[exact])
+
+
+def test_rolling_z_matches_per_group_loop(transactions):
+    sample = transactions.iloc[::3].reset_index(drop=True)
+    z = pipeline.rolling_z_scores(sample, pipeline.log_amounts(sample['Amount']))
+    expected = loop_rolling_z(sample)
+    assert np.isfinite(expected).sum() > len(sample) / 2
+    np.testing.assert_array_equal(np.isnan(z), np.isnan(expected))
+    np.testing.assert_allclose(z[~np.isnan(z)], expected[~np.isnan(expected)], atol=1e-9)
+
+
+def test_batch_scored_with_tails_matches_scoring_all_at_once(transactions):
+    history, batch = split_by_date(transactions)
+    # The history's tails are merged chunk by chunk, as in streaming mode
+    chunks = [history.iloc[start:start + 700] for start in range(0, len(history), 700)]
+    tails = pipeline.amount_tails(chunks[0])
+    for chunk in chunks[1:]:
+        tails = pipeline.merge_amount_tails(tails, pipeline.amount_tails(chunk))
+
+    everything = pd.concat([history, batch], ignore_index=True)
+    all_at_once = pipeline.rolling_z_scores(everything, pipeline.log_amounts(everything['Amount']))[len(history):]
+    incremental = pipeline.rolling_z_scores(batch, pipeline.log_amounts(batch['Amount']), tails)
+    np.testing.assert_allclose(incremental, all_at_once, atol=1e-9)
+
+    # With the same stored sketches the flagged rows are the same as well
+    sketches = {column: pipeline.group_sketches(history, column) for column in pipeline.SKETCH_GROUPS}
+    flagged = pipeline.score_anomalies(batch, sketches, tails)
+    everything_flagged = pipeline.score_anomalies(everything, sketches)
+    everything_flagged = everything_flagged[everything_flagged.index >= len(history)]
+    assert len(flagged)
+    assert sorted(flagged.index + len(history)) == sorted(everything_flagged.index)
@@ -0,0 +1,22 @@
+import os
+
+import Daily_Household_Transactions as pipeline
+
+
+def test_prune_keeps_files_that_are_not_cache_entries(tmp_path):
+    ledger = tmp_path / 'ledger.csv'
+    ledger.write_text('Date,Mode,Category,Subcategory,Note,Amount,Income/Expense,Currency\n')
+    (tmp_path / 'notes.txt').write_text('not a cache entry')
+    stale = ['1-2-0123abcd-v1-full.arrow', '1-2-0123abcd-v1-chunk500-aggregates.pkl']
+    for name in stale:
+        (tmp_path / name).write_bytes(b'')
+
+    cache_file = pipeline.cache_key(str(ledger), str(tmp_path)) + '.arrow'
+    open(cache_file, 'wb').close()
+    aggregates_file = pipeline.aggregates_file_for(str(ledger), str(tmp_path), variant='chunk500')
+    open(aggregates_file, 'wb').close()
+    pipeline.prune_cache(cache_file)
+
+    assert sorted(os.listdir(tmp_path)) == sorted([
+        'ledger.csv', 'notes.txt', 'manifest.json', os.path.basename(cache_file), os.path.basename(aggregates_file),
+    ])
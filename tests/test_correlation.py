@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+import Daily_Household_Transactions as pipeline
+
+
+def pandas_correlation(df):
+    # Monthly mean amount per Category, 0 for months without the Category
+    months = df['Date'].dt.to_period('M').rename('YearMonth')
+    means = df.groupby([months, 'Category'], observed=True)['Amount'].mean().unstack(fill_value=0)
+    order = sorted(means.columns, key=str)
+    return means[order].corr().loc[order, order]
+
+
+def assert_same_matrix(result, expected):
+    pd.testing.assert_frame_equal(result, expected, check_names=False, check_index_type=False,
+                                  check_column_type=False, check_categorical=False, atol=1e-9)
+
+
+def test_matches_pandas_corr(transactions):
+    aggregates = pipeline.update_correlation(pipeline.build_aggregates(transactions))
+    matrix = pipeline.correlation_matrix(aggregates['correlation'])
+    assert_same_matrix(matrix, pandas_correlation(transactions))
+
+
+def test_late_rows_replace_their_month(transactions):
+    # Hold back rows of a few months in the middle and of the last month, then add them as a later batch
+    months = transactions['Date'].dt.to_period('M')
+    late_months = months.drop_duplicates().sort_values().iloc[[3, 10, -1]]
+    late = months.isin(late_months) & (np.arange(len(transactions)) % 3 == 0)
+    history, batch = transactions[~late], transactions[late]
+
+    aggregates = pipeline.update_correlation(pipeline.build_aggregates(history))
+    batch_aggregates = pipeline.build_aggregates(batch)
+    aggregates = pipeline.merge_aggregates(aggregates, batch_aggregates)
+    touched_months = set(batch_aggregates['month_category'].index.get_level_values('YearMonth').unique())
+    pipeline.update_correlation(aggregates, touched_months)
+
+    full = pipeline.update_correlation(pipeline.build_aggregates(transactions))
+    assert aggregates['correlation']['n'] == full['correlation']['n']
+    assert_same_matrix(pipeline.correlation_matrix(aggregates['correlation']),
+                       pipeline.correlation_matrix(full['correlation']))
+    assert_same_matrix(pipeline.correlation_matrix(aggregates['correlation']), pandas_correlation(transactions))
@@ -0,0 +1,13 @@
+import numpy as np
+import pandas as pd
+
+import generate_transactions
+
+
+def test_format_dates_layouts():
+    timestamps = pd.to_datetime(['2018-09-01 08:05:09', '2018-09-13 20:00:00', '2018-11-02 00:00:00',
+                                 '2018-03-04 11:12:13']).astype('int64') // 10 ** 9
+    bare = np.array([True, True, True, False])
+    padded = np.array([False, True, True, True])
+    text = generate_transactions.format_dates(timestamps.to_numpy(), bare, padded)
+    assert text.tolist() == ['1/9/2018', '13/09/2018', '2/11/2018', '04/03/2018 11:12:13']
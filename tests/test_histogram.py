@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+
+import Daily_Household_Transactions as pipeline
+
+
+def assert_same_histogram(result, expected):
+    assert result['width'] == expected['width']
+    assert result['offset'] == expected['offset']
+    np.testing.assert_array_equal(result['counts'], expected['counts'])
+
+
+def test_chunk_histograms_merge_to_the_whole():
+    amounts = pd.Series(np.random.default_rng(0).lognormal(5, 2, 20000))
+    merged = pipeline.amount_histogram(amounts.iloc[:1000])
+    for start in range(1000, len(amounts), 3000):
+        merged = pipeline.merge_histograms(merged, pipeline.amount_histogram(amounts.iloc[start:start + 3000]))
+    assert_same_histogram(merged, pipeline.amount_histogram(amounts))
+
+
+def test_merge_with_empty_part():
+    hist = pipeline.amount_histogram(pd.Series([12.5, 300.0, 7.25]))
+    for empty in [pd.Series([], dtype=np.float64), pd.Series([np.nan, np.nan])]:
+        empty = pipeline.amount_histogram(empty)
+        assert_same_histogram(pipeline.merge_histograms(hist, empty), hist)
+        assert_same_histogram(pipeline.merge_histograms(empty, hist), hist)
+        assert pipeline.merge_histograms(empty, empty)['counts'].sum() == 0
+    coarse = pipeline.coarsen_histogram(pipeline.amount_histogram(pd.Series([], dtype=np.float64)), 1.0)
+    assert coarse['width'] == 1.0 and len(coarse['counts']) == 0
@@ -0,0 +1,28 @@
+import os
+import shutil
+
+import Daily_Household_Transactions as pipeline
+import process_households
+from conftest import ROOT
+
+
+def test_header_only_ledger_does_not_stop_the_run(tmp_path):
+    ledgers = tmp_path / 'ledgers'
+    ledgers.mkdir()
+    source = os.path.join(ROOT, pipeline.DATA_FILE)
+    shutil.copy(source, ledgers / 'a.csv')
+    shutil.copy(source, ledgers / 'b.csv')
+    with open(source) as f:
+        (ledgers / 'empty.csv').write_text(f.readline())
+
+    paths = process_households.find_ledgers(str(ledgers))
+    summary, rollup = process_households.process_households(paths, str(tmp_path / 'out'), jobs=2)
+    process_households.write_rollup(summary, rollup, str(tmp_path / 'out'))
+
+    assert list(summary['household']) == ['a', 'b', 'empty']
+    assert summary['error'].isna().all()
+    assert list(summary['transactions']) == [2452, 2452, 0]
+    assert rollup['cube']['count'].sum() == 2 * 2452
+    # Account ledgers, recurring payments and anomaly windows are not mixed across households
+    assert not set(process_households.HOUSEHOLD_ONLY) & set(rollup)
+    assert os.path.exists(tmp_path / 'out' / 'households.csv')
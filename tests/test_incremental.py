@@ -0,0 +1,78 @@
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import Daily_Household_Transactions as pipeline
+from conftest import ROOT
+
+TRANSACTIONS = 2452
+
+
+@pytest.fixture
+def feeds(tmp_path):
+    # Two overlapping daily feeds cut from the bundled export
+    with open(os.path.join(ROOT, pipeline.DATA_FILE)) as f:
+        lines = f.readlines()
+    old, new = tmp_path / 'old.csv', tmp_path / 'new.csv'
+    old.write_text(''.join(lines[:1] + lines[1:1500]))
+    new.write_text(''.join(lines[:1] + lines[1200:]))
+    return str(old), str(new)
+
+
+def ingest(path, state_dir, sql_store):
+    return pipeline.ingest_incremental(path, state_dir, chunksize=400, sql_store=sql_store)
+
+
+def assert_ingested_once(state_dir, sql_store):
+    aggregates = pd.read_pickle(os.path.join(state_dir, 'aggregates.pkl'))
+    assert aggregates['cube']['count'].sum() == TRANSACTIONS
+    segments = pipeline.load_hash_segments(os.path.join(state_dir, 'index'))
+    assert sum(len(segment) for segment in segments) == len(np.unique(np.concatenate(segments))) == TRANSACTIONS
+    with sqlite3.connect(sql_store) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == TRANSACTIONS
+    assert not [f for _, _, files in os.walk(state_dir) for f in files if f.endswith(pipeline.PENDING_SUFFIX)]
+
+
+def fail_on_call(function, failing_call):
+    calls = []
+
+    def wrapper(*args):
+        calls.append(args)
+        if len(calls) == failing_call:
+            raise OSError('simulated failure')
+        return function(*args)
+    return wrapper
+
+
+# Each step fails once in the second run, after all its pending files and rows were
+# written: saving the aggregates, or moving the run's files or SQL rows into place
+# after saving (the first call of the roll-forward steps finishes the previous run)
+@pytest.mark.parametrize('step, failing_call', [
+    ('save_pickle', 1), ('roll_forward_pending', 2), ('roll_forward_sql', 2),
+])
+def test_failed_run_is_not_counted_twice(feeds, tmp_path, monkeypatch, step, failing_call):
+    old, new = feeds
+    state_dir, sql_store = str(tmp_path / 'state'), str(tmp_path / 'store.sqlite')
+    ingest(old, state_dir, sql_store)
+
+    original = getattr(pipeline, step)
+    monkeypatch.setattr(pipeline, step, fail_on_call(original, failing_call))
+    with pytest.raises(OSError):
+        ingest(new, state_dir, sql_store)
+    monkeypatch.setattr(pipeline, step, original)
+
+    ingest(new, state_dir, sql_store)
+    assert_ingested_once(state_dir, sql_store)
+
+
+def test_compacted_index_keeps_every_hash(feeds, tmp_path, monkeypatch):
+    old, new = feeds
+    state_dir, sql_store = str(tmp_path / 'state'), str(tmp_path / 'store.sqlite')
+    monkeypatch.setattr(pipeline, 'INDEX_SEGMENT_LIMIT', 2)
+    ingest(old, state_dir, sql_store)
+    ingest(new, state_dir, sql_store)
+    assert len(os.listdir(os.path.join(state_dir, 'index'))) == 1
+    assert_ingested_once(state_dir, sql_store)
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import Daily_Household_Transactions as pipeline
+from conftest import split_by_date
+
+
+@pytest.fixture(scope='module')
+def ledger_rows(transactions):
+    # Every third transfer to an account also shows up as Income on that account
+    # (naming the sender), so some transfers are matched and do not credit twice
+    accounts = set(transactions['Mode'].astype(str))
+    to_account = ((transactions['Income/Expense'] == 'Transfer-Out')
+                  & transactions['Category'].astype(str).isin(accounts)).to_numpy()
+    legs = transactions[to_account].iloc[::3].copy()
+    legs = legs.assign(**{'Mode': legs['Category'].astype(str), 'Category': legs['Mode'].astype(str),
+                          'Income/Expense': 'Income'})
+    rows = pd.concat([transactions.astype({column: str for column in pipeline.CUBE_DIMENSIONS}), legs],
+                     ignore_index=True)
+    return rows.astype({column: 'category' for column in pipeline.CUBE_DIMENSIONS}), len(legs)
+
+
+def brute_force_balances(df, date, matched_cells):
+    # Sum every row up to and including the date, one row at a time
+    accounts = set(df['Mode'].astype(str))
+    balances = {}
+    rows = df[df['Date'].dt.floor('D') <= date]
+    for day, mode, category, subcategory, flow, amount in zip(
+            rows['Date'].dt.floor('D'), rows['Mode'].astype(str), rows['Category'].astype(str),
+            rows['Subcategory'].astype(str), rows['Income/Expense'].astype(str), rows['Amount']):
+        balances[mode] = balances.get(mode, 0.0) + pipeline.FLOW_SIGNS.get(flow, 0.0) * amount
+        matched = (day, category, subcategory, mode, flow) in matched_cells
+        if flow == 'Transfer-Out' and category in accounts and not matched:
+            balances[category] = balances.get(category, 0.0) + amount
+    return pd.Series(balances, dtype=np.float64)
+
+
+def matched_out_cells(cube):
+    pairs = pipeline.match_transfers(cube)
+    cells = cube.index[pairs['out_cell'].to_numpy()]
+    return {(day, str(category), str(subcategory), str(mode), str(flow))
+            for day, category, subcategory, mode, flow in cells}
+
+
+def test_balances_match_brute_force_sums(ledger_rows):
+    df, added_legs = ledger_rows
+    aggregates = pipeline.update_ledger(pipeline.build_aggregates(df))
+    matched = matched_out_cells(aggregates['cube'])
+    assert len(matched) >= added_legs * 0.9
+
+    days = pd.date_range(df['Date'].min().floor('D') - pd.Timedelta(days=3), df['Date'].max().floor('D'))
+    dates = np.random.default_rng(0).choice(days, 15, replace=False)
+    for date in list(dates) + [days[-1]]:
+        balances = pipeline.balances_as_of(aggregates['ledger'], date)
+        expected = brute_force_balances(df, pd.Timestamp(date), matched).reindex(balances.index, fill_value=0.0)
+        np.testing.assert_allclose(balances.to_numpy(), expected.to_numpy(), atol=1e-6)
+
+
+def test_appended_days_match_full_build(ledger_rows):
+    df, _ = ledger_rows
+    history, batch = split_by_date(df)
+    aggregates = pipeline.update_ledger(pipeline.build_aggregates(history))
+    batch_aggregates = pipeline.build_aggregates(batch)
+    aggregates = pipeline.merge_aggregates(aggregates, batch_aggregates)
+    touched_days = set(batch_aggregates['cube'].index.get_level_values('Day').unique())
+    appended = aggregates['ledger']
+    pipeline.update_ledger(aggregates, touched_days)
+    assert aggregates['ledger'] is appended
+
+    full = pipeline.update_ledger(pipeline.build_aggregates(df))['ledger']
+    ledger = aggregates['ledger']
+    assert ledger['last_day'] == full['last_day']
+    assert sorted(ledger['accounts']) == sorted(full['accounts'])
+    assert max(len(account['checkpoints']) for account in full['accounts'].values()) > 2
+    for name, account in full['accounts'].items():
+        np.testing.assert_array_equal(ledger['accounts'][name]['days'], account['days'])
+        np.testing.assert_allclose(ledger['accounts'][name]['amounts'], account['amounts'])
+        np.testing.assert_allclose(ledger['accounts'][name]['checkpoints'], account['checkpoints'], atol=1e-6)
+        running = pipeline.running_balance(ledger, name)
+        assert running.iloc[-1] == pytest.approx(pipeline.account_balance(account, full['last_day']))
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import Daily_Household_Transactions as pipeline
+
+
+def payments(days, subcategory, note, amount):
+    return pd.DataFrame({
+        'Date': pd.to_datetime(days),
+        'Subcategory': subcategory,
+        'Note': note,
+        'Amount': amount,
+    })
+
+
+def test_monthly_series_with_a_missed_payment():
+    # On the 5th of every month of 2018 except April; other spending runs until 20 December
+    months = [month for month in range(1, 13) if month != 4]
+    frame = pd.concat([
+        payments([f'2018-{month:02d}-05 10:00' for month in months], 'Netflix', 'Netflix 199', 199.0),
+        payments(['2018-12-20 18:30'], 'Grocery', 'Vegetables', 120.0),
+    ], ignore_index=True)
+
+    recurring = pipeline.detect_recurring(pipeline.occurrence_table(frame))
+    assert len(recurring) == 1
+    found = recurring.iloc[0]
+    assert (found['Subcategory'], found['Note'], found['Period']) == ('Netflix', 'netflix', 'monthly')
+    assert found['Occurrences'] == 11
+    assert found['Missed'] == 1
+    assert found['Last'] == pd.Timestamp('2018-12-05')
+    assert found['NextExpected'] == pd.Timestamp('2018-12-05') + pd.Timedelta(days=30)
+    assert found['Status'] == 'active'
+
+
+def test_stopped_weekly_series():
+    # Every Monday until 5 March, then nothing for four weeks
+    frame = pd.concat([
+        payments(pd.date_range('2018-01-01', '2018-03-05', freq='7D'), 'Milk', 'Milk delivery', 60.0),
+        payments(['2018-04-02'], 'Grocery', 'Vegetables', 120.0),
+    ], ignore_index=True)
+
+    found = pipeline.detect_recurring(pipeline.occurrence_table(frame)).iloc[0]
+    assert found['Period'] == 'weekly'
+    assert found['Occurrences'] == 10
+    assert found['Missed'] == 3
+    assert found['Status'] == 'stopped'
+
+
+def contiguous_chunks(df, sizes):
+    # Chunks of consecutive rows in time, like a date-ordered export read in chunks
+    ordered = df.sort_values('Date', kind='stable').reset_index(drop=True)
+    cuts = np.cumsum(sizes)
+    return [ordered.iloc[start:end] for start, end in zip(np.r_[0, cuts], np.r_[cuts, len(ordered)])]
+
+
+@pytest.mark.parametrize('newest_first', [False, True])
+def test_merged_chunks_equal_the_whole_table(transactions, newest_first):
+    chunks = contiguous_chunks(transactions, [1, 250, 400, 999, 1600, 3])
+    if newest_first:
+        chunks = chunks[::-1]
+    merged = pipeline.occurrence_table(chunks[0])
+    for chunk in chunks[1:]:
+        merged = pipeline.merge_occurrences(merged, pipeline.occurrence_table(chunk))
+
+    whole = pipeline.occurrence_table(transactions)
+    assert len(pipeline.detect_recurring(whole))
+    pd.testing.assert_frame_equal(merged.sort_index(), whole.sort_index(), check_index_type=False,
+                                  check_categorical=False)
+    pd.testing.assert_frame_equal(pipeline.detect_recurring(merged), pipeline.detect_recurring(whole))
+
+
+def test_incremental_run_merged_into_history_equals_the_whole_table(transactions):
+    # As in ingest_incremental: the run's chunks are merged first, then the run into the history
+    history, *run = contiguous_chunks(transactions, [3500, 700, 700])
+    run_occurrences = pipeline.occurrence_table(run[0])
+    for chunk in run[1:]:
+        run_occurrences = pipeline.merge_occurrences(run_occurrences, pipeline.occurrence_table(chunk))
+    merged = pipeline.merge_occurrences(pipeline.occurrence_table(history), run_occurrences)
+
+    pd.testing.assert_frame_equal(merged.sort_index(), pipeline.occurrence_table(transactions).sort_index(),
+                                  check_index_type=False, check_categorical=False)
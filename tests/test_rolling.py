@@ -0,0 +1,61 @@
+import pandas as pd
+import pytest
+
+import Daily_Household_Transactions as pipeline
+from conftest import split_by_date
+
+
+def pandas_rolling(df, column):
+    # Time-based rolling windows over each group's daily spend, on every day from the first to the last
+    spend = df[df['Income/Expense'].isin(pipeline.ROLLING_FLOWS)]
+    days = spend['Date'].dt.floor('D').rename('Day')
+    daily = spend.groupby([days, spend[column].astype(str)])['Amount'].agg(['sum', 'count'])
+    all_days = pd.date_range(daily.index.get_level_values(0).min(), daily.index.get_level_values(0).max(), name='Day')
+    frames = {}
+    for window in pipeline.ROLLING_WINDOWS:
+        for stat in ['sum', 'count']:
+            dense = daily[stat].unstack(fill_value=0).reindex(all_days, fill_value=0)
+            frames[f'{stat}_{window}d'] = dense.rolling(f'{window}D').sum().stack()
+    expected = pd.DataFrame(frames)
+    expected.index.names = ['Day', column]
+    return expected[expected[f'count_{max(pipeline.ROLLING_WINDOWS)}d'] > 0]
+
+
+def rolling_table(state, column):
+    table = state['table'].copy()
+    table.index = table.index.set_levels(table.index.levels[1].astype(str), level=1)
+    return table.sort_index()
+
+
+@pytest.mark.parametrize('column', pipeline.ROLLING_GROUPS)
+def test_matches_pandas_rolling(transactions, column):
+    aggregates = pipeline.update_rolling(pipeline.build_aggregates(transactions))
+    table = rolling_table(aggregates['rolling'][column], column)
+    expected = pandas_rolling(transactions, column).sort_index()
+
+    assert table.index.equals(expected.index)
+    for window in pipeline.ROLLING_WINDOWS:
+        pd.testing.assert_series_equal(table[f'sum_{window}d'], expected[f'sum_{window}d'], check_names=False)
+        pd.testing.assert_series_equal(table[f'count_{window}d'].astype(float), expected[f'count_{window}d'],
+                                       check_names=False)
+
+
+@pytest.mark.parametrize('column', pipeline.ROLLING_GROUPS)
+def test_appended_days_match_full_build(transactions, column):
+    history, batch = split_by_date(transactions)
+    aggregates = pipeline.update_rolling(pipeline.build_aggregates(history))
+    batch_aggregates = pipeline.build_aggregates(batch)
+    aggregates = pipeline.merge_aggregates(aggregates, batch_aggregates)
+    touched_days = set(batch_aggregates['cube'].index.get_level_values('Day').unique())
+    appended = aggregates['rolling'][column]
+    pipeline.update_rolling(aggregates, touched_days)
+    # The batch starts after the history's last day, so it is appended rather than rebuilt
+    assert aggregates['rolling'][column] is appended
+
+    full = pipeline.update_rolling(pipeline.build_aggregates(transactions))
+    state, full_state = aggregates['rolling'][column], full['rolling'][column]
+    pd.testing.assert_frame_equal(rolling_table(state, column), rolling_table(full_state, column))
+    # The kept tail of daily totals continues the same way as the full build's
+    assert state['last_day'] == full_state['last_day']
+    tail = pd.DataFrame(state['sums'], columns=state['groups'])[full_state['groups']]
+    pd.testing.assert_frame_equal(tail, pd.DataFrame(full_state['sums'], columns=full_state['groups']))
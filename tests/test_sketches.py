@@ -0,0 +1,56 @@
+import numpy as np
+
+import Daily_Household_Transactions as pipeline
+
+QUANTILES = np.linspace(0.01, 0.99, 99)
+# The sketch's rank error is roughly 1.7 / SKETCH_K; the bound leaves some room for the seed
+RANK_ERROR = 3 / pipeline.SKETCH_K
+
+
+def rank_errors(values, estimates, quantiles):
+    # Distance between the estimates' ranks in the data and the ranks asked for
+    values = np.sort(values)
+    low = np.searchsorted(values, estimates, side='left') / len(values)
+    high = np.searchsorted(values, estimates, side='right') / len(values)
+    return np.maximum(low - quantiles, 0) + np.maximum(quantiles - high, 0)
+
+
+def test_small_sketch_is_exact():
+    values = np.random.default_rng(0).lognormal(5, 1, pipeline.SKETCH_K)
+    sketch = pipeline.amount_sketch(values)
+    assert len(sketch['levels']) == 1
+    np.testing.assert_array_equal(pipeline.sketch_quantiles(sketch, QUANTILES),
+                                  np.quantile(values, QUANTILES, method='inverted_cdf'))
+
+
+def test_merged_chunk_sketches_stay_within_rank_error():
+    rng = np.random.default_rng(1)
+    chunks = [rng.lognormal(5, 1.5, size) for size in rng.integers(1, 5000, 200)]
+    values = np.concatenate(chunks)
+
+    merged = pipeline.amount_sketch(chunks[0])
+    for chunk in chunks[1:]:
+        merged = pipeline.merge_sketches(merged, pipeline.amount_sketch(chunk))
+
+    assert len(merged['levels']) > 1
+    assert merged['count'] == len(values)
+    assert merged['min'] == values.min()
+    assert merged['max'] == values.max()
+    assert sum(len(level) for level in merged['levels']) <= 3 * pipeline.SKETCH_K + len(merged['levels'])
+    assert rank_errors(values, pipeline.sketch_quantiles(merged, QUANTILES), QUANTILES).max() < RANK_ERROR
+
+
+def test_merge_order_does_not_matter_for_accuracy():
+    rng = np.random.default_rng(2)
+    chunks = [rng.normal(100, 20, 3000) for _ in range(40)]
+    values = np.concatenate(chunks)
+
+    sketches = [pipeline.amount_sketch(chunk) for chunk in chunks]
+    # Pairwise tree of merges, as the process pool produces it
+    while len(sketches) > 1:
+        sketches = [pipeline.merge_sketches(*sketches[i:i + 2]) if i + 1 < len(sketches) else sketches[i]
+                    for i in range(0, len(sketches), 2)]
+    tree = sketches[0]
+
+    assert tree['count'] == len(values)
+    assert rank_errors(values, pipeline.sketch_quantiles(tree, QUANTILES), QUANTILES).max() < RANK_ERROR
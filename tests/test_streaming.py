@@ -0,0 +1,32 @@
+import os
+
+import Daily_Household_Transactions as pipeline
+from conftest import ROOT
+
+
+def test_repeated_rows_spanning_whole_chunks(tmp_path):
+    # The export followed by 500 of its own rows: the last chunk is all duplicates
+    with open(os.path.join(ROOT, pipeline.DATA_FILE)) as f:
+        lines = f.readlines()
+    path = tmp_path / 'repeated.csv'
+    path.write_text(''.join(lines + lines[1:501]))
+
+    streamed = pipeline.load_aggregates_streaming(str(path), chunksize=500, cache_dir=None)
+    full = pipeline.build_aggregates(pipeline.clean_data(pipeline.read_transactions(str(path)), verbose=False))
+    assert streamed['cube']['count'].sum() == full['cube']['count'].sum()
+    assert streamed['amount_histogram']['counts'].sum() == full['amount_histogram']['counts'].sum()
+
+
+def test_sql_store_is_filled_in_the_streaming_pass(tmp_path, monkeypatch):
+    passes = []
+    stream = pipeline.stream_transactions
+    monkeypatch.setattr(pipeline, 'stream_transactions', lambda *args: passes.append(args) or stream(*args))
+    store = str(tmp_path / 'store.sqlite')
+    source = os.path.join(ROOT, pipeline.DATA_FILE)
+
+    aggregates = pipeline.load_aggregates_streaming(source, chunksize=500, cache_dir=None, sql_store=store)
+    assert len(passes) == 1
+    assert pipeline.sql_store_is_current(store, source)
+    total = pipeline.query_sql_store(store, "SELECT COUNT(*) AS n, SUM(amount) AS total FROM transactions")
+    assert total['n'][0] == aggregates['cube']['count'].sum()
+    assert abs(total['total'][0] - aggregates['cube']['sum'].sum()) < 1e-6